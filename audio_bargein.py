@@ -0,0 +1,160 @@
+"""
+Barge-in / interruption controller
+
+Ties together the three places that know a participant is talking over the
+assistant:
+
+- the local speech decision on the (echo-cancelled) capture path
+- the server's `interrupted` flag on `server_content`
+- turn completion in `receive_audio`
+
+On an interruption the playback jitter buffer is flushed (applied on the next
+output callback, i.e. within one frame), anything still queued for playback is
+dropped, and further audio of the interrupted response is discarded until the
+server closes that turn. Reaction time is measured from the start of the
+speech run (the first speech chunk, so the `min_speech_ms` debounce is
+included) to the moment the output callback applied the flush; the onset to
+decision part is also reported on its own.
+
+A local barge-in needs `min_speech_ms` of consecutive speech, and while our
+own playback is in the capture only chunks the echo suppressor attributes to
+the near end count (`EchoSuppressor.near_end_speech`). A converging echo
+canceller leaves residual bursts the VAD flags as speech; without the gate the
+assistant cuts off its own reply.
+
+Offline check with sample.wav as echo-only capture:
+    python audio_bargein.py
+"""
+
+import time
+
+
+class InterruptionController:
+    """Cuts playback as soon as local speech or a server interruption is seen"""
+
+    def __init__(self, audio_queue=None, min_speech_ms=180.0):
+        self.audio_queue = audio_queue
+        self.playback = None
+        self.min_speech_ms = min_speech_ms
+        self.speech_ms = 0.0
+        self.speech_started_at = None
+        self.discarding = False
+
+        # Metrics
+        self.local_barge_ins = 0
+        self.server_interruptions = 0
+        self.discarded_chunks = 0
+        self.detection_ms = []  # speech onset -> barge-in decision
+
+    def attach(self, playback):
+        """Attach the CallbackPlayback whose jitter buffer should be cut"""
+        self.playback = playback
+
+    def assistant_speaking(self) -> bool:
+        if self.playback is None:
+            return False
+        jitter = self.playback.jitter
+        return jitter.playing or jitter.ring.available() > 0
+
+    def on_capture(self, is_speech: bool, captured_at: float = None, chunk_ms: float = 0.0):
+        """Feed the (echo-gated) local speech decision for every captured chunk"""
+        if not is_speech:
+            self.speech_ms = 0.0
+            self.speech_started_at = None
+            return
+        if self.speech_started_at is None and captured_at is not None:
+            # captured_at is when the chunk was read, i.e. the end of its audio
+            self.speech_started_at = captured_at - chunk_ms / 1000
+        before = self.speech_ms
+        self.speech_ms += chunk_ms
+        if before < self.min_speech_ms <= self.speech_ms and self.assistant_speaking():
+            self.local_barge_ins += 1
+            if captured_at is not None:
+                self.detection_ms.append((captured_at - self.speech_started_at) * 1000)
+            self._interrupt(self.speech_started_at)
+
+    def on_server_interrupted(self):
+        """Server detected the interruption (server_content.interrupted)"""
+        self.server_interruptions += 1
+        if self.assistant_speaking():
+            self._interrupt(time.monotonic())
+        # The server has closed the interrupted generation; its next audio is a new response
+        self.discarding = False
+
+    def on_turn_complete(self):
+        self.discarding = False
+
+    def accept_audio(self) -> bool:
+        """Whether receive_audio should forward this chunk to playback"""
+        if self.discarding:
+            self.discarded_chunks += 1
+            return False
+        return True
+
+    def _interrupt(self, detected_at):
+        self.discarding = True
+        if self.audio_queue is not None:
+            while not self.audio_queue.empty():
+                self.audio_queue.get_nowait()
+        if self.playback is not None:
+            self.playback.jitter.flush(requested_at=detected_at)
+
+    def stats(self) -> dict:
+        reactions = sorted(self.playback.jitter.flush_latencies_ms) if self.playback else []
+        detections = sorted(self.detection_ms)
+        return {
+            "local_barge_ins": self.local_barge_ins,
+            "server_interruptions": self.server_interruptions,
+            "discarded_chunks": self.discarded_chunks,
+            "reaction_ms_p50": round(reactions[len(reactions) // 2], 1) if reactions else None,
+            "reaction_ms_max": round(reactions[-1], 1) if reactions else None,
+            "detection_ms_p50": round(detections[len(detections) // 2], 1) if detections else None,
+        }
+
+
+def echo_only_check(path="sample.wav", rate=16000, chunk=1024):
+    """sample.wav played back and captured as room echo only: no local barge-in may fire"""
+    import wave
+    import numpy as np
+    from audio_echo import EchoSuppressor
+    from audio_resample import StreamingResampler
+    from audio_vad import VadGate
+
+    with wave.open(path, "rb") as wf:
+        src_rate = wf.getframerate()
+        playback = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    far = StreamingResampler(src_rate, rate)
+    x = np.concatenate([far.process(playback.astype(np.float32) / 32768.0), far.flush()])
+    rng = np.random.default_rng(0)
+    ir = np.zeros(int(rate * 0.06), dtype=np.float32)
+    ir[int(rate * 0.02)] = 0.6
+    ir += (rng.standard_normal(len(ir)) * np.exp(-np.arange(len(ir)) / (rate * 0.01)) * 0.05).astype(np.float32)
+    capture = np.clip(np.convolve(x, ir)[:len(x)] * 32768.0, -32768, 32767).astype(np.int16)
+
+    aec, vad = EchoSuppressor(rate, reference_rate=src_rate), VadGate(rate)
+    chunk_ms = chunk / rate * 1000
+    # Previous behaviour (one chunk of raw VAD), duration only, duration + echo gate
+    one_chunk, duration, gated = (InterruptionController(min_speech_ms=chunk_ms), InterruptionController(),
+                                  InterruptionController())
+    for controller in (one_chunk, duration, gated):
+        controller.assistant_speaking = lambda: True
+    step = chunk * src_rate // rate
+    flagged = []
+    for i, off in enumerate(range(0, len(capture) - chunk + 1, chunk)):
+        aec.push_reference(playback[i * step:(i + 1) * step].tobytes())
+        vad.process(aec.process(capture[off:off + chunk].tobytes()))
+        if vad.last_speech:
+            flagged.append(i)
+        one_chunk.on_capture(vad.last_speech, chunk_ms=chunk_ms)
+        duration.on_capture(vad.last_speech, chunk_ms=chunk_ms)
+        gated.on_capture(aec.near_end_speech(vad.last_speech), chunk_ms=chunk_ms)
+    print(f"🎤 VAD flagged echo chunks {flagged}")
+    print(f"📊 Barge-ins: one chunk {one_chunk.local_barge_ins}, {duration.min_speech_ms:.0f} ms "
+          f"{duration.local_barge_ins}, {gated.min_speech_ms:.0f} ms + echo gate {gated.local_barge_ins}")
+    print(f"📊 Suppressor: {aec.stats()}")
+    assert gated.local_barge_ins == 0, "assistant interrupted itself"
+    print("✅ Echo-only capture never triggers a local barge-in")
+
+
+if __name__ == "__main__":
+    echo_only_check()
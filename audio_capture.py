@@ -0,0 +1,151 @@
+"""
+Callback-mode audio capture
+
+PortAudio calls `_callback` on its own thread with every hardware buffer. The
+samples are copied into a preallocated ring buffer and the asyncio loop is only
+woken once a full frame quantum is available, so the capture path no longer
+pays a thread-pool hop per chunk.
+
+Usage:
+    capture = CallbackCapture(pya, device_index, rate=16000, quantum=1024)
+    await asyncio.to_thread(capture.start, asyncio.get_running_loop())
+    data = await capture.read()      # bytes, exactly `quantum` frames
+"""
+
+import asyncio
+import numpy as np
+import pyaudio
+
+
+class RingBuffer:
+    """Preallocated single-producer / single-consumer int16 ring buffer.
+
+    The producer only advances `write_pos` and the consumer only advances
+    `read_pos`, so no lock is needed between the PortAudio thread and the loop.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.buffer = np.zeros(capacity, dtype=np.int16)
+        self.write_pos = 0  # total samples ever written
+        self.read_pos = 0   # total samples ever read
+
+    def available(self) -> int:
+        return self.write_pos - self.read_pos
+
+    def free(self) -> int:
+        return self.capacity - self.available()
+
+    def write(self, samples: np.ndarray) -> int:
+        """Write as many samples as fit, return the number dropped"""
+        n = min(len(samples), self.free())
+        if n:
+            start = self.write_pos % self.capacity
+            first = min(n, self.capacity - start)
+            self.buffer[start:start + first] = samples[:first]
+            if n > first:
+                self.buffer[:n - first] = samples[first:n]
+            self.write_pos += n
+        return len(samples) - n
+
+    def read_into(self, out: np.ndarray) -> int:
+        """Copy up to len(out) samples into `out`, return the number copied"""
+        n = min(len(out), self.available())
+        if n:
+            start = self.read_pos % self.capacity
+            first = min(n, self.capacity - start)
+            out[:first] = self.buffer[start:start + first]
+            if n > first:
+                out[first:n] = self.buffer[:n - first]
+            self.read_pos += n
+        return n
+
+
+class CallbackCapture:
+    """PortAudio callback-mode input stream feeding a ring buffer"""
+
+    def __init__(self, pya, device_index, rate, channels=1, frames_per_buffer=1024,
+                 quantum=1024, capacity_seconds=2.0):
+        self.pya = pya
+        self.device_index = device_index
+        self.rate = rate
+        self.channels = channels
+        self.frames_per_buffer = frames_per_buffer
+        self.quantum = quantum * channels
+        self.ring = RingBuffer(max(int(rate * capacity_seconds) * channels, self.quantum * 2))
+        self._out = np.zeros(self.quantum, dtype=np.int16)
+        self.stream = None
+        self._loop = None
+        self._ready = None
+        self._wake_pending = False
+
+        # Counters
+        self.overflows = 0        # PortAudio reported input overflow
+        self.underruns = 0        # PortAudio reported input underflow
+        self.dropped_frames = 0   # ring buffer full, consumer too slow
+        self.callbacks = 0
+        self.wakeups = 0
+
+    def start(self, loop):
+        """Open the stream in callback mode (blocking, call via asyncio.to_thread)"""
+        self._loop = loop
+        self._ready = asyncio.Event()
+        self.stream = self.pya.open(
+            format=pyaudio.paInt16,
+            channels=self.channels,
+            rate=self.rate,
+            input=True,
+            input_device_index=self.device_index,
+            frames_per_buffer=self.frames_per_buffer,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        self.callbacks += 1
+        if status & pyaudio.paInputOverflow:
+            self.overflows += 1
+        if status & pyaudio.paInputUnderflow:
+            self.underruns += 1
+
+        dropped = self.ring.write(np.frombuffer(in_data, dtype=np.int16))
+        if dropped:
+            self.dropped_frames += dropped // self.channels
+
+        if not self._wake_pending and self.ring.available() >= self.quantum:
+            self._wake_pending = True
+            self._loop.call_soon_threadsafe(self._wake)
+        return (None, pyaudio.paContinue)
+
+    def _wake(self):
+        self._wake_pending = False
+        self.wakeups += 1
+        self._ready.set()
+
+    async def read(self) -> bytes:
+        """Wait for one full quantum and return it as PCM bytes"""
+        while self.ring.available() < self.quantum:
+            self._ready.clear()
+            if self.ring.available() >= self.quantum:
+                break
+            await self._ready.wait()
+        self.ring.read_into(self._out)
+        return self._out.tobytes()
+
+    def stats(self) -> dict:
+        return {
+            "overflows": self.overflows,
+            "underruns": self.underruns,
+            "dropped_frames": self.dropped_frames,
+            "callbacks": self.callbacks,
+            "wakeups": self.wakeups,
+            "buffered_frames": self.ring.available() // self.channels,
+        }
+
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+            finally:
+                self.stream.close()
+                self.stream = None
@@ -0,0 +1,141 @@
+"""
+Backpressure-aware outbound audio scheduler
+
+Drop-in replacement for the `out_queue` between capture and
+`send_audio_to_gemini`. Items keep the `{"data": ..., "mime_type": ...}` shape.
+When the uplink stalls and a backlog builds, `get()` merges everything queued
+into one larger payload so a single `session.send` drains it. A control item
+without "data" (`{"audio_stream_end": True}`) is never merged or dropped and
+comes out of `get()` on its own, after the audio queued before it.
+
+Policies when the queue is full:
+- "block":         `put()` waits for space (previous behaviour)
+- "drop_oldest":   the oldest queued chunk is discarded
+- "time_compress": the backlog is kept, and on send the quietest 10 ms frames
+                   are cut until it fits `compress_target_ms`
+"""
+
+import asyncio
+import time
+from collections import deque
+import numpy as np
+
+POLICIES = ("block", "drop_oldest", "time_compress")
+
+
+class OutboundAudioScheduler:
+    """Coalescing outbound queue with configurable drop policy and metrics"""
+
+    def __init__(self, rate, maxsize=10, policy="drop_oldest", max_merge_bytes=64000,
+                 compress_target_ms=500, sample_width=2):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown outbound policy: {policy}")
+        self.rate = rate
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_merge_bytes = max_merge_bytes
+        self.compress_target_bytes = int(rate * compress_target_ms / 1000) * sample_width
+        self.sample_width = sample_width
+        self._items = deque()  # (enqueue_time, item)
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._not_full.set()
+
+        # Metrics
+        self.sends = 0
+        self.merged_sends = 0
+        self.dropped_chunks = 0
+        self.compressed_ms = 0.0
+        self.max_depth = 0
+        self.last_staleness_ms = 0.0
+        self.max_staleness_ms = 0.0
+        self.last_captured_at = None  # newest "captured_at" among the items of the last get()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    async def put(self, item):
+        if len(self._items) >= self.maxsize:
+            if self.policy == "block":
+                while len(self._items) >= self.maxsize:
+                    self._not_full.clear()
+                    await self._not_full.wait()
+            elif self.policy == "drop_oldest" or len(self._items) >= self.maxsize * 4:
+                # time_compress still needs a hard cap on memory
+                self._drop_oldest_audio()
+        self._items.append((time.monotonic(), item))
+        self.max_depth = max(self.max_depth, len(self._items))
+        self._not_empty.set()
+
+    async def get(self):
+        """Return one item, merging any backlog into a single payload"""
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        oldest, first = self._items.popleft()
+        if "data" not in first:
+            if not self._items:
+                self._not_empty.clear()
+            self._not_full.set()
+            return first
+        parts = [first["data"]]
+        size = len(first["data"])
+        self.last_captured_at = first.get("captured_at")
+        while self._items and "data" in self._items[0][1] and \
+                size + len(self._items[0][1]["data"]) <= self.max_merge_bytes:
+            item = self._items.popleft()[1]
+            parts.append(item["data"])
+            size += len(parts[-1])
+            self.last_captured_at = item.get("captured_at", self.last_captured_at)
+        if not self._items:
+            self._not_empty.clear()
+        self._not_full.set()
+
+        self.sends += 1
+        if len(parts) > 1:
+            self.merged_sends += 1
+        self.last_staleness_ms = (time.monotonic() - oldest) * 1000
+        self.max_staleness_ms = max(self.max_staleness_ms, self.last_staleness_ms)
+
+        data = parts[0] if len(parts) == 1 else b"".join(parts)
+        if self.policy == "time_compress" and len(data) > self.compress_target_bytes:
+            data = self._compress(data)
+        return {"data": data, "mime_type": first["mime_type"]}
+
+    def _drop_oldest_audio(self):
+        for i, (_, item) in enumerate(self._items):
+            if "data" in item:
+                del self._items[i]
+                self.dropped_chunks += 1
+                return
+
+    def _compress(self, data: bytes) -> bytes:
+        """Cut the quietest 10 ms frames until the payload fits the target"""
+        samples = np.frombuffer(data, dtype=np.int16)
+        frame = max(1, self.rate // 100)
+        n_frames = len(samples) // frame
+        keep = max(1, self.compress_target_bytes // self.sample_width // frame)
+        if n_frames <= keep:
+            return data
+        frames = samples[:n_frames * frame].reshape(n_frames, frame)
+        energy = np.einsum("ij,ij->i", frames.astype(np.float32), frames.astype(np.float32))
+        kept = np.sort(np.argpartition(energy, n_frames - keep)[n_frames - keep:])
+        self.compressed_ms += (n_frames - keep) * 10.0
+        return np.concatenate([frames[kept].ravel(), samples[n_frames * frame:]]).tobytes()
+
+    def stats(self) -> dict:
+        return {
+            "policy": self.policy,
+            "depth": len(self._items),
+            "max_depth": self.max_depth,
+            "sends": self.sends,
+            "merged_sends": self.merged_sends,
+            "dropped_chunks": self.dropped_chunks,
+            "compressed_ms": round(self.compressed_ms, 1),
+            "last_staleness_ms": round(self.last_staleness_ms, 1),
+            "max_staleness_ms": round(self.max_staleness_ms, 1),
+        }
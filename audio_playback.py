@@ -0,0 +1,175 @@
+"""
+Adaptive jitter buffer and callback-mode playback
+
+Gemini delivers response audio in bursts of arbitrary size. `JitterBuffer`
+collects those bursts in a preallocated ring and hands PortAudio constant-size
+frames from its output callback, so playback timing is driven by the device
+clock instead of `stream.write` + `sleep` on the event loop.
+
+Playback of a burst starts once `target_ms` of audio is buffered. Every
+underrun raises the target (up to `max_ms`); a long run without underruns
+lowers it again (down to `min_ms`), so the buffer only holds as much latency
+as the network actually needs.
+"""
+
+import time
+import numpy as np
+import pyaudio
+
+from audio_capture import RingBuffer
+
+
+class JitterBuffer:
+    """Adaptive-depth playout buffer between the event loop and an output callback"""
+
+    def __init__(self, rate, target_ms=60, min_ms=20, max_ms=300, step_ms=20,
+                 relax_after_s=10.0, underrun_gap_s=0.5, capacity_s=60.0):
+        self.rate = rate
+        self.target = int(rate * target_ms / 1000)
+        self.min_target = int(rate * min_ms / 1000)
+        self.max_target = int(rate * max_ms / 1000)
+        self.step = int(rate * step_ms / 1000)
+        self.relax_after = int(rate * relax_after_s)
+        self.underrun_gap = underrun_gap_s
+        self.max_wait = max_ms / 1000.0
+        self.ring = RingBuffer(int(rate * capacity_s))
+        self.playing = False
+        self.clean_frames = 0
+        self._flush_requested = False
+        self._flush_requested_at = None
+        self._burst_start = None
+        self._dry_at = None
+
+        # Metrics
+        self.underruns = 0
+        self.overflow_frames = 0
+        self.frames_played = 0
+        self.bursts = 0
+        self.last_start_latency_ms = 0.0
+        self.max_start_latency_ms = 0.0
+        self.flush_latencies_ms = []
+
+    def push(self, samples: np.ndarray):
+        """Queue int16 samples (event loop side)"""
+        now = time.monotonic()
+        if not self.playing:
+            if self._dry_at is not None and now - self._dry_at < self.underrun_gap:
+                # Ran dry mid-response and more audio arrived: buffer deeper next time
+                self.underruns += 1
+                self.target = min(self.max_target, self.target + self.step)
+            self._dry_at = None
+            if self._burst_start is None:
+                self._burst_start = now
+        self.overflow_frames += self.ring.write(samples)
+
+    def flush(self, requested_at=None):
+        """Discard everything buffered; applied on the next callback"""
+        self._flush_requested_at = requested_at if requested_at is not None else time.monotonic()
+        self._flush_requested = True
+
+    def depth_ms(self) -> float:
+        return self.ring.available() * 1000.0 / self.rate
+
+    def read(self, out: np.ndarray):
+        """Fill `out` with the next frame (PortAudio thread side)"""
+        n = len(out)
+        if self._flush_requested:
+            self._flush_requested = False
+            self.ring.read_pos = self.ring.write_pos
+            self.playing = False
+            self._burst_start = None
+            self._dry_at = None
+            self.flush_latencies_ms.append((time.monotonic() - self._flush_requested_at) * 1000)
+
+        if not self.playing:
+            available = self.ring.available()
+            # Short final bursts never reach the target; start them once they have waited long enough
+            waited = self._burst_start is not None and time.monotonic() - self._burst_start > self.max_wait
+            if available == 0 or (available < self.target and not waited):
+                out[:] = 0
+                return
+            self.playing = True
+            self.bursts += 1
+            if self._burst_start is not None:
+                self.last_start_latency_ms = (time.monotonic() - self._burst_start) * 1000
+                self.max_start_latency_ms = max(self.max_start_latency_ms, self.last_start_latency_ms)
+                self._burst_start = None
+
+        got = self.ring.read_into(out)
+        self.frames_played += got
+        if got < n:
+            out[got:] = 0
+            self.playing = False
+            self._dry_at = time.monotonic()
+            self.clean_frames = 0
+        else:
+            self.clean_frames += n
+            if self.clean_frames >= self.relax_after:
+                self.clean_frames = 0
+                self.target = max(self.min_target, self.target - self.step)
+
+    def stats(self) -> dict:
+        return {
+            "underruns": self.underruns,
+            "overflow_frames": self.overflow_frames,
+            "bursts": self.bursts,
+            "target_ms": round(self.target * 1000.0 / self.rate, 1),
+            "depth_ms": round(self.depth_ms(), 1),
+            "played_s": round(self.frames_played / self.rate, 2),
+            "last_start_latency_ms": round(self.last_start_latency_ms, 1),
+            "max_start_latency_ms": round(self.max_start_latency_ms, 1),
+        }
+
+
+class CallbackPlayback:
+    """Callback-mode output stream fed with constant-size frames from a JitterBuffer"""
+
+    def __init__(self, pya, device_index, rate, frame_ms=20, on_played=None, **jitter_options):
+        self.pya = pya
+        self.device_index = device_index
+        self.rate = rate
+        self.frame = int(rate * frame_ms / 1000)
+        self.jitter = JitterBuffer(rate, **jitter_options)
+        self._out = np.zeros(self.frame, dtype=np.int16)
+        self.on_played = on_played  # called from the PortAudio thread with each frame
+        self.stream = None
+        self.output_underflows = 0
+
+    def start(self):
+        """Open the stream in callback mode (blocking, call via asyncio.to_thread)"""
+        self.stream = self.pya.open(
+            format=pyaudio.paInt16,
+            channels=1,
+            rate=self.rate,
+            output=True,
+            output_device_index=self.device_index,
+            frames_per_buffer=self.frame,
+            stream_callback=self._callback,
+        )
+        self.stream.start_stream()
+
+    def _callback(self, in_data, frame_count, time_info, status):
+        if status & pyaudio.paOutputUnderflow:
+            self.output_underflows += 1
+        out = self._out if frame_count == self.frame else np.zeros(frame_count, dtype=np.int16)
+        self.jitter.read(out)
+        data = out.tobytes()
+        if self.on_played and self.jitter.playing:
+            self.on_played(data)
+        return (data, pyaudio.paContinue)
+
+    def write(self, data: bytes):
+        self.jitter.push(np.frombuffer(data, dtype=np.int16))
+
+    def stats(self) -> dict:
+        stats = self.jitter.stats()
+        stats["output_underflows"] = self.output_underflows
+        return stats
+
+    def close(self):
+        if self.stream is not None:
+            try:
+                self.stream.stop_stream()
+            finally:
+                self.stream.close()
+                self.stream = None
@@ -0,0 +1,101 @@
+"""
+Streaming polyphase resampler
+
+Stateful, block-by-block rational resampler (rate_out / rate_in = L / M) built
+from one windowed-sinc low-pass filter split into L polyphase branches. Each
+block is processed with a single vectorized gather + einsum; filter history and
+the fractional output position are carried between blocks, so arbitrary block
+sizes give the same output as one whole-signal pass.
+
+Used by the capture path (device native rate -> 16 kHz) and the playback path
+(24 kHz -> device native rate).
+
+Run this file directly for a throughput benchmark:
+    python audio_resample.py
+"""
+
+from math import gcd
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+class StreamingResampler:
+    """Rational polyphase resampler for mono float32 / int16 streams"""
+
+    def __init__(self, rate_in: int, rate_out: int, quality: int = 16, beta: float = 8.0):
+        g = gcd(int(rate_in), int(rate_out))
+        self.rate_in = int(rate_in)
+        self.rate_out = int(rate_out)
+        self.up = self.rate_out // g
+        self.down = self.rate_in // g
+        self.taps = int(np.ceil(quality * max(1.0, self.down / self.up)))
+
+        # Prototype low-pass at the upsampled rate, cutoff below both Nyquists
+        n_total = self.up * self.taps
+        cutoff = 0.95 / max(self.up, self.down)
+        n = np.arange(n_total) - (n_total - 1) / 2.0
+        h = cutoff * np.sinc(cutoff * n) * np.kaiser(n_total, beta)
+        h *= self.up / h.sum()
+
+        # phases[p, j] multiplies x[n - j]; stored reversed to match window order
+        self.phases = h.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32).copy()
+
+        self.history = np.zeros(self.taps - 1, dtype=np.float32)
+        self.pos = (self.taps - 1) * self.up  # next output position, in 1/up input samples
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        """Resample one float32 block, returning every output now computable"""
+        x = np.concatenate([self.history, np.asarray(block, dtype=np.float32)])
+        total = len(x) * self.up
+        if total <= self.pos:
+            self.history = x[-(self.taps - 1):] if self.taps > 1 else x[:0]
+            self.pos -= (len(x) - len(self.history)) * self.up
+            return np.zeros(0, dtype=np.float32)
+
+        count = (total - self.pos + self.down - 1) // self.down
+        positions = self.pos + self.down * np.arange(count)
+        idx = positions // self.up
+        phase = positions % self.up
+
+        windows = sliding_window_view(x, self.taps)[idx - (self.taps - 1)]
+        y = np.einsum("ij,ij->i", windows, self.phases[phase])
+
+        keep = self.taps - 1
+        consumed = len(x) - keep
+        self.history = x[consumed:].copy()
+        self.pos = self.pos + self.down * count - consumed * self.up
+        return y
+
+    def process_int16(self, data: bytes) -> bytes:
+        """Resample a PCM16 byte block"""
+        x = np.frombuffer(data, dtype=np.int16).astype(np.float32) * (1.0 / 32768.0)
+        y = self.process(x)
+        return np.clip(y * 32768.0, -32768, 32767).astype(np.int16).tobytes()
+
+    def flush(self) -> np.ndarray:
+        """Push the filter tail out (end of stream)"""
+        return self.process(np.zeros(self.taps, dtype=np.float32))
+
+    def reset(self):
+        self.history[:] = 0.0
+        self.pos = (self.taps - 1) * self.up
+
+
+def benchmark(seconds: float = 30.0, block: int = 1024):
+    """Print throughput (x realtime) for the two conversions used by the client"""
+    import time
+    for rate_in, rate_out in ((48000, 16000), (24000, 48000), (44100, 16000)):
+        rs = StreamingResampler(rate_in, rate_out)
+        signal = (np.random.default_rng(0).standard_normal(int(rate_in * seconds)) * 0.1).astype(np.float32)
+        start = time.perf_counter()
+        produced = 0
+        for off in range(0, len(signal), block):
+            produced += len(rs.process(signal[off:off + block]))
+        elapsed = time.perf_counter() - start
+        print(f"{rate_in:>6} -> {rate_out:<6} taps={rs.taps * rs.up:<4} "
+              f"{produced / rate_out:6.2f}s audio in {elapsed * 1000:7.1f} ms  "
+              f"({seconds / elapsed:8.1f}x realtime)")
+
+
+if __name__ == "__main__":
+    benchmark()
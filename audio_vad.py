@@ -0,0 +1,129 @@
+"""
+Streaming voice-activity gate
+
+Sits between capture and the send path. Each captured chunk is split into
+short sub-frames and classified with two vectorized features:
+
+- energy (dBFS) against an adaptive noise floor
+- zero-crossing rate, to reject hiss and broadband noise
+
+Speech chunks are forwarded together with a pre-roll of the chunks captured
+just before onset, and forwarding continues for a hangover period after the
+last speech frame so word endings and the server's end-of-turn silence still
+reach Gemini. During long silence only a short zero keep-alive is sent.
+`segment_ended` marks the chunk on which the gate closes after speech, so the
+sender can tell the server the audio stream has ended instead of leaving its
+VAD waiting for audio that will not come.
+"""
+
+from collections import deque
+import numpy as np
+
+
+class VadGate:
+    """Energy + zero-crossing VAD with hangover and pre-roll buffers"""
+
+    def __init__(self, rate, sample_width=2, frame_ms=20, threshold_db=-50.0, margin_db=9.0,
+                 zcr_max=0.35, hangover_ms=600, preroll_ms=300, keepalive_s=5.0, keepalive_ms=20):
+        self.rate = rate
+        self.sample_width = sample_width
+        self.frame_len = max(1, int(rate * frame_ms / 1000))
+        self.threshold_db = threshold_db
+        self.margin_db = margin_db
+        self.zcr_max = zcr_max
+        self.hangover_samples = int(rate * hangover_ms / 1000)
+        self.preroll_samples = int(rate * preroll_ms / 1000)
+        self.keepalive_samples = int(rate * keepalive_s)
+        self.keepalive_chunk = bytes(int(rate * keepalive_ms / 1000) * sample_width)
+
+        self.noise_floor_db = threshold_db
+        self.preroll = deque()
+        self.preroll_len = 0
+        self.in_speech = False
+        self.last_speech = False
+        self.segment_ended = False
+        self.hangover_left = 0
+        self.silence_since_send = 0
+
+        # Counters
+        self.bytes_captured = 0
+        self.bytes_sent = 0
+        self.speech_segments = 0
+        self.keepalives = 0
+        self.stream_ends = 0
+
+    def is_speech(self, samples: np.ndarray) -> bool:
+        """Classify a chunk: speech if any sub-frame passes both features"""
+        n = len(samples) // self.frame_len * self.frame_len
+        if n == 0:
+            return False
+        frames = samples[:n].astype(np.float32).reshape(-1, self.frame_len) / 32768.0
+
+        rms = np.sqrt(np.mean(frames * frames, axis=1) + 1e-12)
+        energy_db = 20.0 * np.log10(rms)
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / self.frame_len
+
+        threshold = max(self.threshold_db, self.noise_floor_db + self.margin_db)
+        speech = (energy_db > threshold) & (zcr < self.zcr_max)
+
+        # Track the noise floor from non-speech frames only
+        quiet = energy_db[~speech]
+        if quiet.size:
+            self.noise_floor_db = 0.95 * self.noise_floor_db + 0.05 * float(np.median(quiet))
+        return bool(speech.any())
+
+    def process(self, data: bytes) -> list:
+        """Feed one captured chunk, return the list of chunks to send"""
+        self.bytes_captured += len(data)
+        samples = np.frombuffer(data, dtype=np.int16)
+        n = len(samples)
+        out = []
+
+        self.segment_ended = False
+        self.last_speech = self.is_speech(samples)
+        if self.last_speech:
+            if not self.in_speech:
+                self.in_speech = True
+                self.speech_segments += 1
+                out.extend(self.preroll)
+                self.preroll.clear()
+                self.preroll_len = 0
+            self.hangover_left = self.hangover_samples
+            out.append(data)
+        elif self.in_speech and self.hangover_left > 0:
+            self.hangover_left -= n
+            out.append(data)
+        else:
+            if self.in_speech:
+                self.segment_ended = True
+                self.stream_ends += 1
+            self.in_speech = False
+            self.preroll.append(data)
+            self.preroll_len += n
+            while self.preroll and self.preroll_len - len(self.preroll[0]) // self.sample_width >= self.preroll_samples:
+                self.preroll_len -= len(self.preroll.popleft()) // self.sample_width
+
+        if out:
+            self.silence_since_send = 0
+        else:
+            self.silence_since_send += n
+            if self.silence_since_send >= self.keepalive_samples:
+                self.silence_since_send = 0
+                self.keepalives += 1
+                out.append(self.keepalive_chunk)
+
+        self.bytes_sent += sum(len(chunk) for chunk in out)
+        return out
+
+    def stats(self) -> dict:
+        saved = 1.0 - self.bytes_sent / self.bytes_captured if self.bytes_captured else 0.0
+        return {
+            "bytes_captured": self.bytes_captured,
+            "bytes_sent": self.bytes_sent,
+            "saved_ratio": round(saved, 3),
+            "speech_segments": self.speech_segments,
+            "keepalives": self.keepalives,
+            "stream_ends": self.stream_ends,
+            "noise_floor_db": round(self.noise_floor_db, 1),
+        }
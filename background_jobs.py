@@ -0,0 +1,271 @@
+"""
+Shared background job pool
+
+Agent analysis used to start a new daemon thread and a new asyncio event loop
+for every created task, so a burst of tasks meant an unbounded number of both,
+and their errors were only printed. `BackgroundJobs` replaces that with:
+
+- a fixed number of worker threads, each with one long-lived event loop, so a
+  slow or blocking agent call never stalls the audio loop
+- a priority queue (lower number runs first, FIFO within a priority)
+- job ids with status (queued / running / done / failed / cancelled)
+- one writer task on the session's loop that delivers notifications (e.g.
+  failures) back into the live session in order
+
+Run this file directly for a soak test with hundreds of jobs.
+"""
+
+import asyncio
+import itertools
+import queue
+import threading
+import time
+from collections import OrderedDict
+from latency_tracer import RollingHistogram
+
+_STOP = object()
+
+
+class Job:
+    """One unit of background work and its status"""
+
+    def __init__(self, job_id, name, priority, fn, args):
+        self.id = job_id
+        self.name = name
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.status = "queued"
+        self.submitted_at = time.monotonic()
+        self.started_at = None
+        self.finished_at = None
+        self.error = None
+
+    def info(self) -> dict:
+        return {"id": self.id, "name": self.name, "priority": self.priority,
+                "status": self.status, "error": self.error}
+
+
+class BackgroundJobs:
+    """Bounded worker pool with a priority queue and a single session writer"""
+
+    def __init__(self, max_workers=2, max_history=500, error_message=None):
+        self.max_workers = max_workers
+        self.max_history = max_history
+        self.error_message = error_message  # (job, exception) -> text for the session, or None
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._ids = itertools.count(1)
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._loop = None
+        self._outbox = None
+        self._writer_task = None
+        self.wait_ms = RollingHistogram()
+        self.run_ms = RollingHistogram()
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.running = 0
+        self.max_running = 0
+        self.max_queued = 0
+        self.delivered = 0
+        self.delivery_errors = 0
+
+    def start(self, writer=None):
+        """Start the workers and, with `writer` (async (text)), the session writer"""
+        self._loop = asyncio.get_running_loop()
+        if writer is not None:
+            self._outbox = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._write(writer))
+        while len(self._threads) < self.max_workers:
+            thread = threading.Thread(target=self._work, name=f"bg-job-{len(self._threads)}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, fn, *args, priority=5, name=None) -> int:
+        """Queue `await fn(*args)` and return its job id"""
+        job = Job(next(self._ids), name or getattr(fn, "__name__", "job"), priority, fn, args)
+        with self._lock:
+            self.submitted += 1
+            self._jobs[job.id] = job
+            self._trim_history()
+        self._queue.put((priority, next(self._seq), job))
+        self.max_queued = max(self.max_queued, self._queue.qsize())
+        return job.id
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        return job.info() if job else None
+
+    def notify(self, text: str):
+        """Queue a message for the live session (safe from any thread)"""
+        if self._outbox is None or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(self._outbox.put_nowait, text)
+
+    def _work(self):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            while True:
+                _, _, job = self._queue.get()
+                if job is _STOP:
+                    break
+                if job.status == "cancelled":
+                    continue
+                self._run(loop, job)
+        finally:
+            loop.close()
+
+    def _run(self, loop, job):
+        with self._lock:
+            job.status = "running"
+            job.started_at = time.monotonic()
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        self.wait_ms.add((job.started_at - job.submitted_at) * 1000)
+        try:
+            loop.run_until_complete(job.fn(*job.args))
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            print(f"❌ Background job {job.id} ({job.name}) failed: {e}")
+            if self.error_message:
+                self.notify(self.error_message(job, e))
+        finally:
+            job.finished_at = time.monotonic()
+            self.run_ms.add((job.finished_at - job.started_at) * 1000)
+            with self._lock:
+                self.running -= 1
+                if job.status == "done":
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def _write(self, writer):
+        # The only task that sends background results into the session
+        while True:
+            text = await self._outbox.get()
+            try:
+                await writer(text)
+                self.delivered += 1
+            except Exception as e:
+                self.delivery_errors += 1
+                print(f"⚠️ Could not deliver background message: {e}")
+
+    def _trim_history(self):
+        while len(self._jobs) > self.max_history:
+            oldest = next(iter(self._jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self._jobs.popitem(last=False)
+
+    async def shutdown(self, timeout_s=2.0):
+        """Cancel queued jobs, let running ones finish briefly, stop the writer"""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == "queued":
+                    job.status = "cancelled"
+                    self.cancelled += 1
+        for _ in self._threads:
+            self._queue.put((float("-inf"), next(self._seq), _STOP))
+        deadline = time.monotonic() + timeout_s
+        for thread in self._threads:
+            await asyncio.to_thread(thread.join, max(0.0, deadline - time.monotonic()))
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        if self._writer_task:
+            # Flush what is already queued for the session
+            while self._outbox.qsize() and time.monotonic() < deadline:
+                await asyncio.sleep(0.01)
+            self._writer_task.cancel()
+            await asyncio.gather(self._writer_task, return_exceptions=True)
+            self._writer_task = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._threads),
+            "submitted": self.submitted,
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "cancelled": self.cancelled,
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "delivered": self.delivered,
+            "delivery_errors": self.delivery_errors,
+            "wait": self.wait_ms.summary(),
+            "run": self.run_ms.summary(),
+        }
+
+
+async def soak(jobs=400, workers=4):
+    """Hundreds of mixed jobs: bounded threads, priorities honoured, every failure delivered"""
+    import random
+
+    rng = random.Random(7)
+    delivered = []
+    writing = False
+
+    async def writer(text):
+        nonlocal writing
+        assert not writing, "two writers in the session at once"
+        writing = True
+        await asyncio.sleep(0.001)
+        delivered.append(text)
+        writing = False
+
+    async def job(i, fail, blocking_s, async_s):
+        time.sleep(blocking_s)  # agent calls may block their loop
+        await asyncio.sleep(async_s)
+        if fail:
+            raise RuntimeError(f"job {i} failed")
+
+    pool = BackgroundJobs(max_workers=workers, max_history=jobs * 2,
+                          error_message=lambda j, e: f"BACKGROUND PROCESSING ERROR: {e}")
+    threads_before = threading.active_count()
+    pool.start(writer)
+    ids, failures = [], 0
+    for i in range(jobs):
+        fail = rng.random() < 0.1
+        failures += fail
+        ids.append(pool.submit(job, i, fail, rng.uniform(0, 0.004), rng.uniform(0, 0.004),
+                               priority=rng.choice((0, 5, 10)), name=f"soak-{i}"))
+    peak_threads = threading.active_count()
+
+    start = time.monotonic()
+    while pool.completed + pool.failed < jobs and time.monotonic() - start < 60:
+        await asyncio.sleep(0.05)
+    while len(delivered) < failures and time.monotonic() - start < 60:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - start
+    by_priority = {}
+    for job_id in ids:
+        j = pool._jobs[job_id]
+        by_priority.setdefault(j.priority, []).append((j.started_at - j.submitted_at) * 1000)
+    await pool.shutdown()
+
+    stats = pool.stats()
+    print(f"⏱️ {jobs} jobs on {workers} workers in {elapsed:.2f}s")
+    print(f"📊 {stats}")
+    for priority in sorted(by_priority):
+        waits = sorted(by_priority[priority])
+        print(f"   priority {priority}: median wait {waits[len(waits) // 2]:.0f} ms")
+    assert stats["completed"] + stats["failed"] == jobs and stats["failed"] == failures
+    assert stats["max_running"] <= workers
+    assert peak_threads - threads_before <= workers
+    assert len(delivered) == failures
+    assert all(pool.status(i)["status"] in ("done", "failed") for i in ids)
+    medians = [sorted(by_priority[p])[len(by_priority[p]) // 2] for p in sorted(by_priority)]
+    assert medians == sorted(medians), "higher priority jobs should wait less"
+    print("✅ Bounded threads, priorities honoured, every failure delivered once")
+
+
+if __name__ == "__main__":
+    asyncio.run(soak())
@@ -0,0 +1,114 @@
+"""
+Event-driven readiness for newly created canvas items
+
+`create_lab` / `create_todo` return before the board has the item, so
+`focus_item` used to wait a fixed 2-3 s. `BoardReadiness.wait_for` polls
+/api/board-items with exponential backoff instead and returns as soon as the
+item is listed, giving up after a timeout (the caller still focuses, as
+before).
+
+Run this file directly to check it against a local stand-in for the
+localhost:3001 board API.
+"""
+
+import asyncio
+import time
+from latency_tracer import RollingHistogram
+
+
+def item_ids(items) -> set:
+    """Ids of a board-items payload (a list of objects, or a single object)"""
+    if isinstance(items, dict):
+        items = [items]
+    return {str(item.get("id")) for item in items or [] if isinstance(item, dict)}
+
+
+class BoardReadiness:
+    """Waits until an item id shows up on the board"""
+
+    def __init__(self, fetch_items, initial_delay_s=0.05, max_delay_s=0.8, timeout_s=5.0):
+        self.fetch_items = fetch_items  # async () -> board items
+        self.initial_delay_s = initial_delay_s
+        self.max_delay_s = max_delay_s
+        self.timeout_s = timeout_s
+        self.wait_ms = RollingHistogram()
+
+        # Metrics
+        self.waits = 0
+        self.ready = 0
+        self.timeouts = 0
+        self.polls = 0
+        self.poll_errors = 0
+
+    async def wait_for(self, item_id, timeout_s=None) -> bool:
+        """True once `item_id` is on the board, False after the timeout"""
+        self.waits += 1
+        start = time.monotonic()
+        deadline = start + (timeout_s if timeout_s is not None else self.timeout_s)
+        delay = self.initial_delay_s
+        while True:
+            self.polls += 1
+            try:
+                if str(item_id) in item_ids(await self.fetch_items()):
+                    self.ready += 1
+                    self.wait_ms.add((time.monotonic() - start) * 1000)
+                    return True
+            except Exception as e:
+                # Board briefly unavailable: keep polling until the deadline
+                self.poll_errors += 1
+                if self.poll_errors == 1:
+                    print(f"⚠️ Board poll failed: {e}")
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                self.timeouts += 1
+                print(f"⏰ {item_id} not on the board after {time.monotonic() - start:.1f}s")
+                return False
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, self.max_delay_s)
+
+    def stats(self) -> dict:
+        return {
+            "waits": self.waits,
+            "ready": self.ready,
+            "timeouts": self.timeouts,
+            "polls": self.polls,
+            "poll_errors": self.poll_errors,
+            "wait": self.wait_ms.summary(),
+        }
+
+
+async def board_check(appear_after_s=0.3, port=3991):
+    """Items appear on a stand-in board after `appear_after_s`; focus must follow promptly"""
+    from aiohttp import web
+    from retrieval_service import RetrievalService
+
+    items = []
+
+    async def board_items(request):
+        return web.json_response(items)
+
+    app = web.Application()
+    app.router.add_get("/api/board-items", board_items)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    service = RetrievalService(board_url=f"http://127.0.0.1:{port}")
+    readiness = BoardReadiness(service.fetch_board_items, timeout_s=2.0)
+    try:
+        asyncio.get_running_loop().call_later(appear_after_s, items.append, {"id": "lab-1", "title": "ALT"})
+        start = time.monotonic()
+        assert await readiness.wait_for("lab-1")
+        waited = time.monotonic() - start
+        assert not await readiness.wait_for("missing", timeout_s=0.3)
+    finally:
+        await service.close()
+        await runner.cleanup()
+
+    print(f"⏱️ Item ready after {waited * 1000:.0f} ms (created at {appear_after_s * 1000:.0f} ms, fixed sleep was 2000 ms)")
+    print(f"📊 {readiness.stats()}")
+    assert waited < appear_after_s + readiness.max_delay_s
+    print("✅ Focus follows item creation without a fixed sleep")
+
+
+if __name__ == "__main__":
+    asyncio.run(board_check())
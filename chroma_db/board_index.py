@@ -0,0 +1,133 @@
+"""
+Persistent, incremental board-item index for get_canvas_objects
+
+`rag_from_json` rebuilds everything per question: fetch all board items,
+convert, chunk, re-embed every chunk, build a throwaway collection, query it,
+delete it. `BoardIndex` keeps the chunks in a persistent Chroma collection with
+the item id and a content hash in each chunk's metadata, so a sync only
+embeds new or changed items and deletes removed ones. A question then costs
+a single query embedding.
+
+Sync is split so the network part stays async in the caller:
+
+    added, removed = index.diff(items)            # local, cheap
+    embeddings = await embed(texts of added)      # only what changed
+    index.apply(added, embeddings, removed)
+    index.query(query_embedding, top_k)
+
+With backend="numpy" the chunks live in a NumpyVectorStore (cosine) instead
+of a Chroma collection; the sync and query code is the same.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from typing import List
+import chromadb
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from chroma_db.chroma_script import VECTOR_BACKEND, json_to_markdown
+from chroma_db.numpy_store import NumpyVectorStore
+
+
+def item_hash(item) -> str:
+    return hashlib.sha256(json.dumps(item, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class BoardIndex:
+    """One set of chunks per board item id, re-embedded only when its content hash changes"""
+
+    def __init__(self, persist_dir: str = "./chroma_db/board_store", collection_name: str = "board_items",
+                 chunk_size: int = 1000, chunk_overlap: int = 200, backend: str = None):
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.backend = backend or VECTOR_BACKEND
+        self.splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._lock = threading.Lock()
+        self._collection = None
+        self._hashes = None  # item id -> content hash of what is indexed
+
+        # Metrics
+        self.syncs = 0
+        self.embedded_items = 0
+        self.embedded_chunks = 0
+        self.deleted_items = 0
+
+    def collection(self):
+        if self._collection is None:
+            os.makedirs(self.persist_dir, exist_ok=True)
+            if self.backend == "numpy":
+                self._collection = NumpyVectorStore(self.persist_dir, self.collection_name, metric="cosine")
+                if self._collection.exists():
+                    self._collection = NumpyVectorStore.load(self.persist_dir, self.collection_name)
+            else:
+                client = chromadb.PersistentClient(path=self.persist_dir)
+                self._collection = client.get_or_create_collection(name=self.collection_name,
+                                                                   metadata={"hnsw:space": "cosine"})
+            # What is already indexed, from a previous session
+            existing = self._collection.get(include=["metadatas"])
+            self._hashes = {meta["item_id"]: meta["hash"] for meta in existing["metadatas"] or []}
+        return self._collection
+
+    def diff(self, items):
+        """(chunks to add as (id, item_id, hash, text), item ids to remove)"""
+        if isinstance(items, dict):
+            items = [items]
+        with self._lock:
+            self.collection()
+            current = {}
+            for item in items or []:
+                digest = item_hash(item)
+                current[str(item.get("id", digest))] = (digest, item)
+            removed = [item_id for item_id, digest in self._hashes.items()
+                       if item_id not in current or current[item_id][0] != digest]
+            added = []
+            for item_id, (digest, item) in current.items():
+                if self._hashes.get(item_id) == digest:
+                    continue
+                for i, text in enumerate(self.splitter.split_text(json_to_markdown(item))):
+                    added.append((f"{item_id}:{i}", item_id, digest, text))
+            return added, removed
+
+    def apply(self, added, embeddings: List[List[float]], removed):
+        """Delete removed/changed items, then upsert the new chunks"""
+        if len(embeddings) != len(added):
+            raise ValueError(f"{len(added)} chunks but {len(embeddings)} embeddings")
+        with self._lock:
+            collection = self.collection()
+            if removed:
+                collection.delete(where={"item_id": {"$in": removed}})
+                for item_id in removed:
+                    self._hashes.pop(item_id, None)
+                self.deleted_items += len(removed)
+            if added:
+                collection.upsert(
+                    ids=[chunk_id for chunk_id, _, _, _ in added],
+                    documents=[text for _, _, _, text in added],
+                    embeddings=embeddings,
+                    metadatas=[{"item_id": item_id, "hash": digest} for _, item_id, digest, _ in added],
+                )
+                new_items = {item_id: digest for _, item_id, digest, _ in added}
+                self._hashes.update(new_items)
+                self.embedded_items += len(new_items)
+                self.embedded_chunks += len(added)
+            self.syncs += 1
+
+    def query(self, query_embedding: List[float], top_k: int = 3) -> List[str]:
+        """Top-k chunks, most relevant first"""
+        collection = self.collection()
+        count = collection.count()
+        if not count:
+            return []
+        results = collection.query(query_embeddings=[query_embedding], n_results=min(top_k, count))
+        return list(results["documents"][0])
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "items": len(self._hashes or {}),
+            "syncs": self.syncs,
+            "embedded_items": self.embedded_items,
+            "embedded_chunks": self.embedded_chunks,
+            "deleted_items": self.deleted_items,
+        }
@@ -1,56 +1,143 @@
 # rag_tool.py
-import os, json, requests
+import os, sys, json, asyncio, requests, threading
+if not __package__:
+    # Run as a script from chroma_db/: make the chroma_db.* helpers importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import chromadb
+from chromadb.api.client import SharedSystemClient
 from chromadb.config import Settings
 from typing import List
 import google.generativeai as genai
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
+from chroma_db.store_version import mark_store_updated, store_version
 load_dotenv()
 
 BASE_URL = "http://localhost:3001"
+# One keep-alive session for every board request from this module
+board_session = requests.Session()
 
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
 def get_board_items():
     url = BASE_URL + "/api/board-items"
     
-    response = requests.get(url)
+    response = board_session.get(url, timeout=10)
     data = response.json()
     return data
 
 # ----------------------------
 # Common embedding helper
 # ----------------------------
+EMBEDDING_MODEL = "models/text-embedding-004"
+# Shared by the build and query paths; None disables the cache
+EMBEDDING_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "embedding_cache")
+EMBEDDING_CACHE_MAX_ENTRIES = 100_000
+# Embedding requests in flight at once when a text list spans several batches
+EMBEDDING_CONCURRENCY = 4
+
+_embedding_cache = None
+
+def get_embedding_cache():
+    global _embedding_cache
+    if _embedding_cache is None and EMBEDDING_CACHE_DIR:
+        from chroma_db.embedding_cache import EmbeddingCache
+        _embedding_cache = EmbeddingCache(EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES)
+    return _embedding_cache
+
+def _cached_embeddings(texts):
+    """(cached vectors aligned with texts, indexes still to embed)"""
+    cached = [None] * len(texts)
+    try:
+        cache = get_embedding_cache()
+        if cache:
+            cached = cache.get_many(EMBEDDING_MODEL, texts)
+    except Exception as e:
+        # The cache only saves requests; never fail an embedding because of it
+        print(f"Embedding cache read failed: {e}")
+    return cached, [i for i, v in enumerate(cached) if v is None]
+
+def _cache_batch(texts, embeddings):
+    try:
+        cache = get_embedding_cache()
+        if cache:
+            cache.put_many(EMBEDDING_MODEL, texts, embeddings)
+    except Exception as e:
+        print(f"Embedding cache write failed: {e}")
+
+def _embed_batch(texts):
+    return _embeddings_from_response(genai.embed_content(model=EMBEDDING_MODEL, content=texts))
+
+async def _embed_batch_async(texts):
+    return _embeddings_from_response(await genai.embed_content_async(model=EMBEDDING_MODEL, content=texts))
+
+_embedding_pipeline = None
+
+def get_embedding_pipeline():
+    """Splits cache misses into limit-sized batches, sent concurrently with per-batch retries"""
+    global _embedding_pipeline
+    if _embedding_pipeline is None:
+        from chroma_db.embedding_pipeline import EmbeddingPipeline
+        _embedding_pipeline = EmbeddingPipeline(_embed_batch, _embed_batch_async, on_batch=_cache_batch,
+                                                concurrency=EMBEDDING_CONCURRENCY)
+    return _embedding_pipeline
+
+def _fill_embeddings(cached, missing, embeddings):
+    for i, embedding in zip(missing, embeddings):
+        cached[i] = embedding
+    return cached
+
 def embed_texts(texts: List[str]) -> List[List[float]]:
     """Embed texts using Gemini embedding model"""
-    model = "models/text-embedding-004"
     try:
-        res = genai.embed_content(model=model, content=texts)
-        
-        
-        # Handle the response structure correctly
-        if "embedding" in res:
-            # Single text input - but we might have multiple chunks
-            embedding = res["embedding"]
-            # If it's a list of lists (multiple embeddings), return as is
-            if isinstance(embedding, list) and len(embedding) > 0 and isinstance(embedding[0], list):
-                return embedding
-            # If it's a single embedding (list of floats), wrap it
-            else:
-                return [embedding]
-        elif "data" in res:
-            # Multiple text inputs
-            embeddings = [d["embedding"] for d in res["data"]]
-            return embeddings
-        else:
-            # Fallback - try to extract embeddings from the response
-            print(f"Unexpected response structure: {list(res.keys())}")
-            return []
+        cached, missing = _cached_embeddings(texts)
+        if not missing:
+            return cached
+        embeddings = get_embedding_pipeline().run([texts[i] for i in missing])
+        return _fill_embeddings(cached, missing, embeddings)
     except Exception as e:
         print(f"Error in embed_texts: {e}")
         return []
 
+async def embed_texts_async(texts: List[str], run=None, partial=False) -> List[List[float]]:
+    """Same as embed_texts, over the async client (does not block the event loop)
+
+    The cache's SQLite and memmap work goes through `run(fn, *args)` (default:
+    asyncio.to_thread), e.g. RetrievalService.run for its own pool. With
+    `partial` a text that could not be embedded is None instead of the whole
+    call returning [].
+    """
+    run = run or asyncio.to_thread
+    try:
+        cached, missing = await run(_cached_embeddings, texts)
+        if not missing:
+            return cached
+        embeddings = await get_embedding_pipeline().run_async([texts[i] for i in missing], run=run, partial=partial)
+        return _fill_embeddings(cached, missing, embeddings)
+    except Exception as e:
+        print(f"Error in embed_texts_async: {e}")
+        return [None] * len(texts) if partial else []
+
+def _embeddings_from_response(res) -> List[List[float]]:
+    # Handle the response structure correctly
+    if "embedding" in res:
+        # Single text input - but we might have multiple chunks
+        embedding = res["embedding"]
+        # If it's a list of lists (multiple embeddings), return as is
+        if isinstance(embedding, list) and len(embedding) > 0 and isinstance(embedding[0], list):
+            return embedding
+        # If it's a single embedding (list of floats), wrap it
+        else:
+            return [embedding]
+    elif "data" in res:
+        # Multiple text inputs
+        embeddings = [d["embedding"] for d in res["data"]]
+        return embeddings
+    else:
+        # Fallback - try to extract embeddings from the response
+        print(f"Unexpected response structure: {list(res.keys())}")
+        return []
+
 # ----------------------------
 # 1️⃣ Build Chroma from text files
 # ----------------------------
@@ -75,6 +162,8 @@ def build_chroma_from_texts(dir_path: str, persist_dir: str = "./chroma_store"):
         collection.add(documents=chunks, embeddings=embeddings, ids=ids)
         # print(f"Stored {len(chunks)} chunks from {fname}")
 
+    # Tells long-lived engines (and cached answers) that the store changed
+    mark_store_updated(persist_dir)
     # print("✅ Chroma built successfully.")
     return collection
 
@@ -82,35 +171,105 @@ def build_chroma_from_texts(dir_path: str, persist_dir: str = "./chroma_store"):
 # ----------------------------
 # 1.5️⃣ Query from persistent ChromaDB collection
 # ----------------------------
-def query_chroma_collection(query: str, persist_dir: str = "./chroma_store", collection_name: str = "local_docs", top_k: int = 3):
+class GeminiEmbeddingFunction:
+    """Chroma embedding function backed by embed_texts"""
+
+    def __call__(self, input):
+        return embed_texts(input)
+
+    def embed_query(self, input, **kwargs):
+        embeddings = embed_texts([input])
+        result = embeddings[0] if embeddings else []
+        return [result]
+
+
+# "chroma", or "numpy" for exact in-process search over an exported matrix (numpy_store.py)
+VECTOR_BACKEND = "chroma"
+
+class RetrievalEngine:
+    """Warm Chroma client and collection handle, created once per store
+
+    The collection is reopened when the store's ingest marker changes (e.g.
+    after build_chroma_from_texts); chroma.sqlite3's mtime is no use for this
+    because opening Chroma rewrites it. Queries from concurrent tool calls
+    share the handle; only (re)opening is serialised.
+    """
+
+    def __init__(self, persist_dir: str = "./chroma_store", collection_name: str = "local_docs", backend: str = None):
+        self.persist_dir = persist_dir
+        self.collection_name = collection_name
+        self.backend = backend or VECTOR_BACKEND
+        self._lock = threading.Lock()
+        self._client = None
+        self._collection = None
+        self._version = None
+        self.opens = 0
+        self.queries = 0
+
+    def collection(self):
+        version = store_version(self.persist_dir)
+        if self._collection is not None and version == self._version:
+            return self._collection
+        with self._lock:
+            if self._collection is None or version != self._version:
+                if self._collection is not None:
+                    # Chroma caches one system per path; drop it so the new files are read
+                    SharedSystemClient.clear_system_cache()
+                if self.backend == "numpy":
+                    self._collection = self._open_numpy(version)
+                else:
+                    self._client = chromadb.PersistentClient(path=self.persist_dir)
+                    self._collection = self._client.get_collection(name=self.collection_name)
+                    # Attached once, for callers querying by text
+                    self._collection._embedding_function = GeminiEmbeddingFunction()
+                self._version = version
+                self.opens += 1
+            return self._collection
+
+    def _open_numpy(self, version):
+        """The NumPy copy of the collection, re-exported when the Chroma store is newer"""
+        from chroma_db.numpy_store import NumpyVectorStore
+
+        store = NumpyVectorStore(self.persist_dir, self.collection_name)
+        if store.exists() and (version is None or store.version() >= version):
+            return NumpyVectorStore.load(self.persist_dir, self.collection_name)
+        return NumpyVectorStore.from_chroma(self.persist_dir, self.collection_name)
+
+    def query(self, query_embedding: List[float], top_k: int = 3) -> List[str]:
+        """Top-k documents, most relevant first"""
+        self.queries += 1
+        results = self.collection().query(query_embeddings=[query_embedding], n_results=top_k)
+        if results["documents"] and results["documents"][0]:
+            return list(results["documents"][0])
+        return []
+
+
+_engines = {}
+_engines_lock = threading.Lock()
+
+def get_engine(persist_dir: str = "./chroma_store", collection_name: str = "local_docs",
+               backend: str = None) -> RetrievalEngine:
+    """The process-wide engine for a store"""
+    backend = backend or VECTOR_BACKEND
+    key = (os.path.abspath(persist_dir), collection_name, backend)
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = RetrievalEngine(persist_dir, collection_name, backend)
+        return _engines[key]
+
+
+def query_chroma_collection(query: str, persist_dir: str = "./chroma_store", collection_name: str = "local_docs", top_k: int = 3,
+                            backend: str = None):
 
     try:
-        # Connect to the persistent ChromaDB
-        client = chromadb.PersistentClient(path=persist_dir)
-        collection = client.get_collection(name=collection_name)
-        
-        # Create custom embedding function for queries
-        class CustomEmbeddingFunction:
-            def __call__(self, input):
-                return embed_texts(input)
-            
-            def embed_query(self, input, **kwargs):
-                embeddings = embed_texts([input])
-                result = embeddings[0] if embeddings else []
-                return [result]
-        
-        # Set the embedding function for the collection
-        collection._embedding_function = CustomEmbeddingFunction()
-        
-        # Perform the query
-        results = collection.query(
-            query_texts=[query],
-            n_results=top_k
-        )
+        embeddings = embed_texts([query])
+        if not embeddings:
+            return []
+        documents = get_engine(persist_dir, collection_name, backend).query(embeddings[0], top_k)
         
         # Extract and return the documents
-        if results["documents"] and results["documents"][0]:
-            context = "\n".join(results["documents"][0])
+        if documents:
+            context = "\n".join(documents)
             return context
         else:
             return []
@@ -120,6 +279,16 @@ def query_chroma_collection(query: str, persist_dir: str = "./chroma_store", col
         return []
 
 
+def query_chroma_by_embedding(query_embedding: List[float], persist_dir: str = "./chroma_store",
+                              collection_name: str = "local_docs", top_k: int = 3, backend: str = None):
+    """Top-k documents (most relevant first) for an already embedded query"""
+    try:
+        return get_engine(persist_dir, collection_name, backend).query(query_embedding, top_k)
+    except Exception as e:
+        print(f"Error querying ChromaDB collection: {e}")
+        return []
+
+
 # ----------------------------
 # 2️⃣ RAG from JSON file (no DB)
 # ----------------------------
@@ -197,18 +366,7 @@ def rag_from_json(json_path: str="", query: str="", top_k: int = 3):
         #     data = json.load(f)
         data = get_board_items()
 
-        # Normalize: list of dicts
-        if isinstance(data, dict):
-            data = [data]
-
-        # Convert each object to Markdown string
-        md_blocks = [json_to_markdown(obj) for obj in data]
-
-        # Chunk each Markdown block
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
-        chunks = []
-        for block in md_blocks:
-            chunks.extend(splitter.split_text(block))
+        chunks = board_items_to_chunks(data)
 
         # Embed and store in Chroma
         embeddings = embed_texts(chunks)
@@ -249,7 +407,24 @@ def rag_from_json(json_path: str="", query: str="", top_k: int = 3):
 
 
 
+def board_items_to_chunks(data) -> List[str]:
+    """Board items (list of objects) -> Markdown chunks ready for embedding"""
+    # Normalize: list of dicts
+    if isinstance(data, dict):
+        data = [data]
+
+    # Convert each object to Markdown string
+    md_blocks = [json_to_markdown(obj) for obj in data]
+
+    # Chunk each Markdown block
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    chunks = []
+    for block in md_blocks:
+        chunks.extend(splitter.split_text(block))
+    return chunks
+
+
 ## RUN THIS FOR FIRST TIME TO CREATE VECTOR STORE
-collection = build_chroma_from_texts("patient_data", "./chroma_store")
-print("✅ Collection built successfully!")
-    
\ No newline at end of file
+if __name__ == "__main__":
+    collection = build_chroma_from_texts("patient_data", "./chroma_store")
+    print("✅ Collection built successfully!")
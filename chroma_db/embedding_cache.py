@@ -0,0 +1,212 @@
+"""
+Persistent content-addressed embedding cache
+
+`embed_texts` used to send every text to the embedding model, including
+board chunks and EHR chunks it had embedded many times before. This cache
+sits under `embed_texts` / `embed_texts_async` and is shared by the build and
+query paths (and across processes):
+
+- key: (model, sha256(text))
+- SQLite holds the key -> row mapping and last use; the vectors live in one
+  float32 matrix file that is memory-mapped, so a hit is a row copy
+- past `max_entries` the least recently used entries are evicted and their
+  rows reused; reads only note their access time in memory and it is written
+  with the next `put_many` (or every `touch_batch` hits), so a hit does not
+  commit
+- `put_many` allocates rows and inserts under BEGIN IMMEDIATE, so processes
+  sharing the cache never hand out the same row
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+
+
+class EmbeddingCache:
+    """(model, sha256(text)) -> float32 vector, on disk"""
+
+    def __init__(self, path: str, max_entries: int = 100_000, initial_rows: int = 1024, touch_batch: int = 256):
+        self.path = path
+        self.max_entries = max_entries
+        self.initial_rows = initial_rows
+        self.touch_batch = touch_batch
+        self._touched = {}  # key -> last access time not yet written
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(os.path.join(path, "index.sqlite"), check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, row INTEGER NOT NULL, last_used REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS entries_last_used ON entries(last_used);
+            CREATE TABLE IF NOT EXISTS free_rows (row INTEGER PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+        """)
+        self._db.commit()
+        self.dim = self._meta("dim")
+        self._matrix = None
+        self._capacity = 0
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(model: str, text: str) -> str:
+        return model + ":" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _meta(self, name, default=None):
+        row = self._db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else default
+
+    @property
+    def _matrix_path(self):
+        return os.path.join(self.path, "vectors.f32")
+
+    def _map(self, min_rows=0):
+        """(Re)map the vector file, growing it to at least `min_rows` rows"""
+        row_bytes = self.dim * 4
+        size = os.path.getsize(self._matrix_path) if os.path.exists(self._matrix_path) else 0
+        rows = size // row_bytes
+        # Windows cannot resize a file while a mapping of it is open
+        self._unmap()
+        if rows < max(min_rows, 1):
+            rows = max(min_rows, rows * 2, self.initial_rows)
+            with open(self._matrix_path, "ab") as f:
+                f.truncate(rows * row_bytes)
+        self._matrix = np.memmap(self._matrix_path, dtype=np.float32, mode="r+", shape=(rows, self.dim))
+        self._capacity = rows
+
+    def _unmap(self):
+        """Flush and close the current mapping"""
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix._mmap.close()
+            self._matrix = None
+
+    def get_many(self, model: str, texts):
+        """Cached vectors (lists of floats) aligned with `texts`, None where missing"""
+        if not texts:
+            return []
+        keys = [self.key(model, t) for t in texts]
+        with self._lock:
+            found = {}
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                query = f"SELECT key, row FROM entries WHERE key IN ({','.join('?' * len(part))})"
+                found.update(self._db.execute(query, part).fetchall())
+            result = []
+            if found:
+                if self.dim is None:
+                    self.dim = self._meta("dim")  # written by another process
+                if self._matrix is None or max(found.values()) >= self._capacity:
+                    self._map()
+                vectors = {key: self._matrix[row].tolist() for key, row in found.items()}
+                now = time.time()
+                self._touched.update((key, now) for key in found)
+                if len(self._touched) >= self.touch_batch:
+                    self._write(self._flush_touched)
+            else:
+                vectors = {}
+            for key in keys:
+                result.append(vectors.get(key))
+            hits = sum(v is not None for v in result)
+            self.hits += hits
+            self.misses += len(result) - hits
+            return result
+
+    def put_many(self, model: str, texts, vectors):
+        if not texts or len(texts) != len(vectors):
+            return
+        array = np.asarray(vectors, dtype=np.float32)
+        with self._lock:
+            self._write(self._put, model, texts, array)
+
+    def _write(self, fn, *args):
+        """Run `fn` in one write transaction (BEGIN IMMEDIATE: one writer across processes)"""
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            fn(*args)
+            self._db.commit()
+        except BaseException:
+            self._db.rollback()
+            raise
+
+    def _flush_touched(self):
+        if self._touched:
+            self._db.executemany("UPDATE entries SET last_used = ? WHERE key = ?",
+                                 [(when, key) for key, when in self._touched.items()])
+            self._touched.clear()
+
+    def _put(self, model, texts, array):
+        if self.dim is None:
+            self.dim = self._meta("dim")
+        if self.dim is None:
+            self.dim = int(array.shape[1])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('dim', ?)", (self.dim,))
+        if array.shape[1] != self.dim:
+            return  # another model size; not cached
+        if self._matrix is None:
+            self._map()
+        now = time.time()
+        next_row = self._meta("next_row", 0)
+        for text, vector in zip(texts, array):
+            key = self.key(model, text)
+            existing = self._db.execute("SELECT row FROM entries WHERE key = ?", (key,)).fetchone()
+            if existing:
+                row = existing[0]
+            else:
+                free = self._db.execute("SELECT row FROM free_rows LIMIT 1").fetchone()
+                if free:
+                    row = free[0]
+                    self._db.execute("DELETE FROM free_rows WHERE row = ?", (row,))
+                else:
+                    row = next_row
+                    next_row += 1
+            if row >= self._capacity:
+                self._map(row + 1)
+            self._matrix[row] = vector
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, row, now))
+            self.writes += 1
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('next_row', ?)", (next_row,))
+        # Vectors reach the file before the rows that point at them are committed
+        self._matrix.flush()
+        self._flush_touched()
+        self._evict()
+
+    def _evict(self):
+        count = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        excess = count - self.max_entries
+        if excess <= 0:
+            return
+        # Evict a little extra so eviction does not run on every write
+        excess += self.max_entries // 10
+        rows = self._db.execute("SELECT key, row FROM entries ORDER BY last_used LIMIT ?", (excess,)).fetchall()
+        self._db.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._db.executemany("INSERT OR IGNORE INTO free_rows VALUES (?)", [(row,) for _, row in rows])
+        self.evictions += len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._touched:
+                self._write(self._flush_touched)
+            self._unmap()
+            self._db.close()
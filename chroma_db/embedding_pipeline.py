@@ -0,0 +1,237 @@
+"""
+Batched, concurrent embedding pipeline
+
+`embed_texts` used to send the whole list in one `embed_content` request and
+return [] on any error, so a large board or EHR dump could exceed the request
+limits, and one failure silently discarded every embedding. `EmbeddingPipeline`:
+
+- splits the input into batches within the API's item and token limits
+  (over-long texts are cut to the per-text token limit)
+- runs up to `concurrency` batches at once (threads for the sync path, a
+  semaphore for the async one)
+- retries a failed batch on its own with jittered backoff, then bisects it so
+  one bad text cannot sink its neighbours
+- keeps output order, and hands each successful batch to `on_batch` (the
+  embedding cache) straight away so a re-run only sends what failed; the
+  async path calls it through `run` so disk writes stay off the event loop
+- with `partial=True` a text that failed for good comes back as None instead
+  of failing the call, so callers can use what embedded and retry the rest
+
+Run this file directly for a self-check against a flaky fake API.
+"""
+
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CHARS_PER_TOKEN = 4
+MAX_BATCH_ITEMS = 100     # batchEmbedContents limit
+MAX_TEXT_TOKENS = 2048    # text-embedding-004 input limit
+MAX_BATCH_TOKENS = 20000  # keeps a request well under the payload limit
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+class EmbeddingPipeline:
+    """Embeds any number of texts in limit-sized batches, concurrently, in order"""
+
+    def __init__(self, embed_batch=None, embed_batch_async=None, on_batch=None,
+                 max_items=MAX_BATCH_ITEMS, max_batch_tokens=MAX_BATCH_TOKENS, max_text_tokens=MAX_TEXT_TOKENS,
+                 concurrency=4, retries=2, backoff_s=0.5):
+        self.embed_batch = embed_batch              # (texts) -> vectors, raises on failure
+        self.embed_batch_async = embed_batch_async  # async (texts) -> vectors
+        self.on_batch = on_batch                    # (texts, vectors) after each successful request
+        self.max_items = max_items
+        self.max_batch_tokens = max_batch_tokens
+        self.max_text_chars = max_text_tokens * CHARS_PER_TOKEN
+        self.concurrency = concurrency
+        self.retries = retries
+        self.backoff_s = backoff_s
+
+        # Metrics
+        self.requests = 0
+        self.failed_requests = 0
+        self.splits = 0
+        self.texts = 0
+        self.truncated = 0
+
+    def plan(self, texts):
+        """Lists of indexes, each within the item and token limits"""
+        batches, current, tokens = [], [], 0
+        for i, text in enumerate(texts):
+            cost = min(len(text), self.max_text_chars) // CHARS_PER_TOKEN + 1
+            if current and (len(current) >= self.max_items or tokens + cost > self.max_batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(i)
+            tokens += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _prepare(self, texts):
+        prepared = []
+        for text in texts:
+            if len(text) > self.max_text_chars:
+                self.truncated += 1
+                text = text[:self.max_text_chars]
+            prepared.append(text)
+        self.texts += len(texts)
+        return prepared
+
+    def _checked(self, batch_texts, vectors):
+        if len(vectors) != len(batch_texts):
+            raise EmbeddingError(f"{len(batch_texts)} texts but {len(vectors)} embeddings")
+        return vectors
+
+    def _delay(self, attempt):
+        return random.uniform(0, self.backoff_s * 2 ** attempt)
+
+    # Sync path
+
+    def run(self, texts, partial=False):
+        """Embeddings aligned with `texts`; raises EmbeddingError if any text failed for good
+
+        With `partial` the failed texts are None instead.
+        """
+        originals, texts = texts, self._prepare(texts)
+        out = [None] * len(texts)
+        batches = self.plan(texts)
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches) or 1)) as pool:
+            failures = sum(pool.map(lambda batch: self._run_batch(originals, texts, batch, out), batches))
+        return self._result(out, failures, partial)
+
+    def _run_batch(self, originals, texts, batch, out) -> int:
+        batch_texts = [texts[i] for i in batch]
+        for attempt in range(self.retries + 1):
+            self.requests += 1
+            try:
+                vectors = self._checked(batch_texts, self.embed_batch(batch_texts))
+                break
+            except Exception as e:
+                self.failed_requests += 1
+                error = e
+                if attempt < self.retries:
+                    time.sleep(self._delay(attempt))
+        else:
+            halves = self._split(batch, error)
+            return sum(self._run_batch(originals, texts, half, out) for half in halves) if halves else 1
+        self._deliver(originals, batch, vectors, out)
+        return 0
+
+    # Async path
+
+    async def run_async(self, texts, run=None, partial=False):
+        """Same as `run`; `run(fn, *args)` executes the blocking on_batch callback (default: asyncio.to_thread)"""
+        run = run or asyncio.to_thread
+        originals, texts = texts, self._prepare(texts)
+        out = [None] * len(texts)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        failures = await asyncio.gather(*(self._run_batch_async(originals, texts, batch, out, semaphore, run)
+                                          for batch in self.plan(texts)))
+        return self._result(out, sum(failures), partial)
+
+    async def _run_batch_async(self, originals, texts, batch, out, semaphore, run) -> int:
+        batch_texts = [texts[i] for i in batch]
+        for attempt in range(self.retries + 1):
+            self.requests += 1
+            try:
+                async with semaphore:
+                    vectors = self._checked(batch_texts, await self.embed_batch_async(batch_texts))
+                break
+            except Exception as e:
+                self.failed_requests += 1
+                error = e
+                if attempt < self.retries:
+                    await asyncio.sleep(self._delay(attempt))
+        else:
+            halves = self._split(batch, error)
+            if not halves:
+                return 1
+            return sum(await asyncio.gather(*(self._run_batch_async(originals, texts, half, out, semaphore, run)
+                                              for half in halves)))
+        for i, vector in zip(batch, vectors):
+            out[i] = vector
+        await run(self._notify, [originals[i] for i in batch], vectors)
+        return 0
+
+    # Shared
+
+    def _result(self, out, failures, partial):
+        if failures and not partial:
+            raise EmbeddingError(f"{failures} of {len(out)} texts could not be embedded")
+        return out
+
+    def _split(self, batch, error):
+        """Halves of a batch that keeps failing, so one bad text cannot sink the rest (None for a single text)"""
+        if len(batch) == 1:
+            print(f"❌ Embedding failed for one text: {error}")
+            return None
+        self.splits += 1
+        mid = len(batch) // 2
+        return batch[:mid], batch[mid:]
+
+    def _deliver(self, originals, batch, vectors, out):
+        for i, vector in zip(batch, vectors):
+            out[i] = vector
+        self._notify([originals[i] for i in batch], vectors)
+
+    def _notify(self, batch_texts, vectors):
+        if self.on_batch:
+            try:
+                self.on_batch(batch_texts, vectors)
+            except Exception as e:
+                print(f"⚠️ Embedding batch callback failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "texts": self.texts,
+            "requests": self.requests,
+            "failed_requests": self.failed_requests,
+            "splits": self.splits,
+            "truncated": self.truncated,
+        }
+
+
+def self_check(n=1000):
+    """A flaky fake API with item/size limits: order kept, limits respected, only the bad text fails"""
+    rng = random.Random(3)
+    sent = []
+
+    def fake_embed(texts):
+        if len(texts) > MAX_BATCH_ITEMS or sum(len(t) for t in texts) > MAX_BATCH_TOKENS * CHARS_PER_TOKEN * 1.1:
+            raise EmbeddingError("request too large")
+        if any("POISON" in t for t in texts):
+            raise EmbeddingError("invalid input")
+        if rng.random() < 0.2:
+            raise EmbeddingError("503 unavailable")
+        sent.append(len(texts))
+        return [[float(t.split()[1])] for t in texts]
+
+    async def fake_embed_async(texts):
+        await asyncio.sleep(0.001)
+        return fake_embed(texts)
+
+    texts = [f"text {i} " + "x" * rng.randint(10, 3000) for i in range(n)]
+    pipeline = EmbeddingPipeline(fake_embed, fake_embed_async, backoff_s=0.001)
+    vectors = pipeline.run(texts)
+    assert [v[0] for v in vectors] == list(range(n)), "order lost"
+    assert max(sent) <= MAX_BATCH_ITEMS
+
+    texts[517] = "text 517 POISON"
+    try:
+        asyncio.run(pipeline.run_async(texts))
+        raise AssertionError("poisoned text should fail")
+    except EmbeddingError as e:
+        print(f"⚠️ As expected: {e}")
+    vectors = asyncio.run(pipeline.run_async(texts, partial=True))
+    assert vectors[517] is None and sum(v is None for v in vectors) == 1, "only the bad text is missing"
+    print(f"📊 {len(pipeline.plan(texts))} batches per run, {pipeline.stats()}")
+    print("✅ Batches within limits, order kept, transient failures retried, one bad text isolated")
+
+
+if __name__ == "__main__":
+    self_check()
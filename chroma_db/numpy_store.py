@@ -0,0 +1,266 @@
+"""
+In-process NumPy vector store
+
+The patient corpus is 13 small text files and the board has tens of items.
+At that size Chroma's client, SQLite and HNSW overhead is most of a query.
+`NumpyVectorStore` keeps every embedding in one contiguous float32 matrix and
+answers a query exactly: one matrix-vector product, then `argpartition` for
+the top k.
+
+- `{name}.npy` holds the matrix (loaded with mmap); `{name}.json` holds ids,
+  documents and metadata in the same row order
+- it implements the subset of Chroma's collection API that RetrievalEngine
+  and BoardIndex use (get / add / upsert / delete / count / query), so either
+  backend can sit behind them
+- metrics: "l2" (Chroma's default, used by local_docs) or "cosine" (the board
+  index); distances match Chroma's
+- `from_chroma` exports an existing Chroma collection without re-embedding
+- the embedding dimension is kept (and saved) when the store is emptied, so
+  delete-all, then upsert, and loading an empty store work
+- writers swap in new arrays under the lock; `query` and `top_k` read one
+  consistent snapshot of them
+
+Run this file directly for a self-check of the empty-store cases.
+"""
+
+import json
+import os
+import threading
+from typing import List
+import numpy as np
+
+
+class NumpyVectorStore:
+    """Exact top-k over a float32 matrix, persisted as .npy + .json"""
+
+    def __init__(self, persist_dir: str, name: str, metric: str = "l2"):
+        if metric not in ("l2", "cosine"):
+            raise ValueError(f"Unsupported metric: {metric}")
+        self.persist_dir = persist_dir
+        self.name = name
+        self.metric = metric
+        self._lock = threading.Lock()
+        self.dim = None  # embedding size, kept through delete-all
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._sq_norms = np.zeros(0, dtype=np.float32)
+        self._ids = []
+        self._documents = []
+        self._metadatas = []
+        self._rows = {}  # id -> row
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.persist_dir, f"{self.name}.npy")
+
+    @property
+    def meta_path(self):
+        return os.path.join(self.persist_dir, f"{self.name}.json")
+
+    def exists(self) -> bool:
+        return os.path.exists(self.matrix_path) and os.path.exists(self.meta_path)
+
+    def version(self):
+        """mtime of the matrix file, None if not saved yet"""
+        try:
+            return os.stat(self.matrix_path).st_mtime_ns
+        except OSError:
+            return None
+
+    # Persistence
+
+    @classmethod
+    def load(cls, persist_dir: str, name: str, metric: str = None):
+        """Open a saved store; the matrix is memory-mapped, not read"""
+        with open(os.path.join(persist_dir, f"{name}.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(persist_dir, name, metric or meta.get("metric", "l2"))
+        store.dim = meta.get("dim")
+        matrix = np.load(store.matrix_path, mmap_mode="r")
+        store._set(meta["ids"], meta["documents"], meta["metadatas"], matrix, normalized=True)
+        return store
+
+    def save(self):
+        """Write both files atomically (temp file + rename)"""
+        os.makedirs(self.persist_dir, exist_ok=True)
+        with self._lock:
+            matrix, meta = self._matrix, {
+                "metric": self.metric,
+                "dim": self.dim,
+                "ids": self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas,
+            }
+            tmp = self.matrix_path + ".tmp.npy"
+            np.save(tmp, np.ascontiguousarray(matrix))
+            os.replace(tmp, self.matrix_path)
+            tmp = self.meta_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.meta_path)
+
+    @classmethod
+    def from_chroma(cls, chroma_dir: str, collection_name: str, persist_dir: str = None, metric: str = None):
+        """Export a Chroma collection (embeddings included) and save it"""
+        import chromadb
+
+        client = chromadb.PersistentClient(path=chroma_dir)
+        collection = client.get_collection(name=collection_name)
+        metric = metric or (collection.metadata or {}).get("hnsw:space", "l2")
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        store = cls(persist_dir or chroma_dir, collection_name, metric)
+        if len(data["ids"]):
+            store.upsert(ids=data["ids"], documents=data["documents"],
+                         embeddings=data["embeddings"], metadatas=data["metadatas"], save=False)
+        store.save()
+        return store
+
+    # Collection API subset
+
+    def _set(self, ids, documents, metadatas, matrix, normalized=False):
+        matrix = np.asarray(matrix, dtype=np.float32)
+        if len(ids):
+            matrix = matrix.reshape(len(ids), -1)
+            self.dim = matrix.shape[1]
+        else:
+            matrix = np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self.metric == "cosine" and not normalized:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix = matrix / np.where(norms == 0, 1, norms)
+        self._matrix = matrix if isinstance(matrix, np.memmap) else np.ascontiguousarray(matrix)
+        # ||x - q||^2 = ||x||^2 - 2 x.q + ||q||^2, so l2 ranking needs the row norms once
+        self._sq_norms = np.einsum("ij,ij->i", self._matrix, self._matrix) if self.metric == "l2" else None
+        self._ids = list(ids)
+        self._documents = list(documents)
+        self._metadatas = [m or {} for m in metadatas]
+        self._rows = {id_: row for row, id_ in enumerate(self._ids)}
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def get(self, ids=None, include=("documents", "metadatas")):
+        with self._lock:
+            rows = range(len(self._ids)) if ids is None else [self._rows[i] for i in ids if i in self._rows]
+            result = {"ids": [self._ids[r] for r in rows]}
+            if "documents" in include:
+                result["documents"] = [self._documents[r] for r in rows]
+            if "metadatas" in include:
+                result["metadatas"] = [self._metadatas[r] for r in rows]
+            if "embeddings" in include:
+                result["embeddings"] = np.array(self._matrix[list(rows)])
+            return result
+
+    def add(self, ids, documents, embeddings, metadatas=None, save=True):
+        self.upsert(ids, documents, embeddings, metadatas, save)
+
+    def upsert(self, ids, documents, embeddings, metadatas=None, save=True):
+        if not len(ids):
+            return
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            # Upserted rows go to the end; replaced rows are dropped from their old place
+            replaced = set(ids)
+            keep = [r for r in range(len(self._ids)) if self._ids[r] not in replaced]
+            vectors = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+            if self.dim is not None and vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != {self.dim}")
+            old = np.array(self._matrix[keep]) if keep else np.zeros((0, vectors.shape[1]), dtype=np.float32)
+            if self.metric == "cosine":
+                norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+                vectors = vectors / np.where(norms == 0, 1, norms)
+            self._set([self._ids[r] for r in keep] + list(ids),
+                      [self._documents[r] for r in keep] + list(documents),
+                      [self._metadatas[r] for r in keep] + list(metadatas),
+                      np.vstack([old, vectors]), normalized=True)
+        if save:
+            self.save()
+
+    def delete(self, ids=None, where=None, save=True):
+        """Delete by ids and/or a {"key": value} or {"key": {"$in": [...]}} metadata filter"""
+        with self._lock:
+            doomed = set(ids or [])
+            if where:
+                for key, condition in where.items():
+                    values = set(condition["$in"]) if isinstance(condition, dict) else {condition}
+                    doomed.update(self._ids[r] for r, meta in enumerate(self._metadatas) if meta.get(key) in values)
+            if not doomed:
+                return
+            keep = [r for r in range(len(self._ids)) if self._ids[r] not in doomed]
+            self._set([self._ids[r] for r in keep], [self._documents[r] for r in keep],
+                      [self._metadatas[r] for r in keep],
+                      np.array(self._matrix[keep]), normalized=True)
+        if save:
+            self.save()
+
+    def _snapshot(self):
+        """Arrays and lists of one state; writers replace them rather than mutate"""
+        with self._lock:
+            return self._matrix, self._sq_norms, self._ids, self._documents, self._metadatas
+
+    def query(self, query_embeddings, n_results: int = 3):
+        """Chroma-shaped results: {"ids", "documents", "metadatas", "distances"}, one list per query"""
+        matrix, sq_norms, ids, documents, metadatas = self._snapshot()
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_embedding in query_embeddings:
+            rows, distances = self._top_k(matrix, sq_norms, query_embedding, n_results)
+            result["ids"].append([ids[r] for r in rows])
+            result["documents"].append([documents[r] for r in rows])
+            result["metadatas"].append([metadatas[r] for r in rows])
+            result["distances"].append(distances)
+        return result
+
+    def top_k(self, query_embedding: List[float], k: int = 3):
+        """(rows, distances) of the k nearest rows, nearest first"""
+        matrix, sq_norms, _, _, _ = self._snapshot()
+        return self._top_k(matrix, sq_norms, query_embedding, k)
+
+    def _top_k(self, matrix, sq_norms, query_embedding, k):
+        n = matrix.shape[0]
+        k = min(k, n)
+        if not k:
+            return [], []
+        q = np.asarray(query_embedding, dtype=np.float32)
+        if self.metric == "cosine":
+            q = q / (np.linalg.norm(q) or 1.0)
+        scores = matrix @ q  # one matvec over the contiguous matrix
+        if self.metric == "l2":
+            scores = 2 * scores - sq_norms  # larger is nearer
+        rows = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+        rows = rows[np.argsort(-scores[rows])]
+        if self.metric == "cosine":
+            distances = 1.0 - scores[rows]
+        else:
+            distances = float(q @ q) - scores[rows]
+        return rows.tolist(), distances.tolist()
+
+
+def self_check():
+    """Delete-all then upsert, load-empty, and a board-style replace on an emptied store"""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as persist_dir:
+        store = NumpyVectorStore(persist_dir, "check", metric="cosine")
+        store.upsert(ids=["a:0", "b:0"], documents=["a", "b"], embeddings=[[1, 0, 0], [0, 1, 0]],
+                     metadatas=[{"item_id": "a"}, {"item_id": "b"}])
+        store.delete(where={"item_id": {"$in": ["a", "b"]}})
+        assert store.count() == 0 and store._matrix.shape == (0, 3)
+        assert store.query([[1, 0, 0]])["ids"] == [[]]
+
+        reloaded = NumpyVectorStore.load(persist_dir, "check")
+        assert reloaded.count() == 0 and reloaded.dim == 3
+        reloaded.upsert(ids=[], documents=[], embeddings=[])
+        reloaded.upsert(ids=["c:0"], documents=["c"], embeddings=[[0, 0, 2]], metadatas=[{"item_id": "c"}])
+        assert reloaded.query([[0, 0, 1]])["documents"] == [["c"]]
+        try:
+            reloaded.upsert(ids=["d:0"], documents=["d"], embeddings=[[1, 2]])
+            raise AssertionError("wrong dimension should be rejected")
+        except ValueError:
+            pass
+
+        reloaded.delete(ids=["c:0"])
+        reloaded.upsert(ids=["e:0"], documents=["e"], embeddings=[[0, 1, 0]])
+        assert NumpyVectorStore.load(persist_dir, "check").get()["ids"] == ["e:0"]
+    print("✅ Delete-all, load-empty and re-upsert keep the embedding dimension")
+
+
+if __name__ == "__main__":
+    self_check()
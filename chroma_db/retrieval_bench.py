@@ -0,0 +1,120 @@
+"""
+Per-query latency of the retrieval paths (no embedding API needed)
+
+Builds a throwaway store from patient_data with random embeddings and times
+a top-k query the way query_chroma_collection used to do it (new client,
+get_collection, new embedding function per call) against the long-lived
+RetrievalEngine on each backend (Chroma, and the NumPy store exported from
+it), each in a fresh process, checking that both backends return the same
+documents and open the store once.
+
+    python -m chroma_db.retrieval_bench
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+import chromadb
+from chroma_db.chroma_script import RetrievalEngine, GeminiEmbeddingFunction
+from chroma_db.numpy_store import NumpyVectorStore
+from chroma_db.store_version import mark_store_updated
+
+DIM = 768
+
+
+def patient_chunks():
+    splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
+    data_dir = os.path.join(HERE, "patient_data")
+    chunks = []
+    for fname in sorted(os.listdir(data_dir)):
+        if fname.endswith(".txt"):
+            with open(os.path.join(data_dir, fname), encoding="utf-8") as f:
+                chunks.extend(splitter.split_text(f.read()))
+    return chunks
+
+
+def build_store(persist_dir, chunks, embeddings):
+    client = chromadb.PersistentClient(path=persist_dir)
+    collection = client.get_or_create_collection(name="local_docs")
+    collection.add(documents=chunks, embeddings=embeddings.tolist(), ids=[f"chunk_{i}" for i in range(len(chunks))])
+    mark_store_updated(persist_dir)
+
+
+def timed(fn, queries, repeat=3):
+    """Median per-query latency (ms) over `repeat` passes"""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for q in queries:
+            fn(q)
+        runs.append((time.perf_counter() - start) / len(queries) * 1000)
+    return sorted(runs)[len(runs) // 2]
+
+
+def legacy_query(persist_dir):
+    def query(query_embedding):
+        client = chromadb.PersistentClient(path=persist_dir)
+        collection = client.get_collection(name="local_docs")
+        collection._embedding_function = GeminiEmbeddingFunction()
+        return collection.query(query_embeddings=[query_embedding.tolist()], n_results=3)["documents"][0]
+    return query
+
+
+def engine_leg(persist_dir, backend, queries):
+    """Time one backend's long-lived engine; runs in a fresh process (see main)"""
+    start = time.perf_counter()
+    engine = RetrievalEngine(persist_dir, backend=backend)
+    engine.query(queries[0].tolist())  # opens the store (numpy: exports it to .npy)
+    first_ms = (time.perf_counter() - start) * 1000
+    ms = timed(lambda q: engine.query(q.tolist()), queries)
+    documents = [engine.query(q.tolist()) for q in queries]
+    return {"ms": ms, "first_ms": first_ms, "opens": engine.opens, "documents": documents}
+
+
+def numpy_top_k_leg(persist_dir, queries):
+    store = NumpyVectorStore.load(persist_dir, "local_docs")
+    return timed(lambda q: store.top_k(q, 3), queries)
+
+
+def main(n_queries=100):
+    rng = np.random.default_rng(0)
+    chunks = patient_chunks()
+    embeddings = rng.standard_normal((len(chunks), DIM)).astype(np.float32)
+    queries = rng.standard_normal((n_queries, DIM)).astype(np.float32)
+
+    # Each engine starts in a fresh process, as in the app: nothing is warm and
+    # a store that keeps reopening itself shows up in `opens`
+    spawn = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as persist_dir, spawn.Pool(1, maxtasksperchild=1) as pool:
+        build_store(persist_dir, chunks, embeddings)
+        results = {"chroma: new client per query": timed(legacy_query(persist_dir), queries)}
+        legs = {backend: pool.apply(engine_leg, (persist_dir, backend, queries)) for backend in ("chroma", "numpy")}
+        results["chroma: long-lived engine"] = legs["chroma"]["ms"]
+        results["numpy: long-lived engine"] = legs["numpy"]["ms"]
+        results["numpy: top_k on mmap'd matrix"] = pool.apply(numpy_top_k_leg, (persist_dir, queries))
+
+    # Exact search; HNSW is effectively exact at this size, so the answers should agree
+    agree = sum(a == b for a, b in zip(legs["chroma"]["documents"], legs["numpy"]["documents"]))
+    opens = {backend: leg["opens"] for backend, leg in legs.items()}
+
+    print(f"📚 {len(chunks)} chunks x {DIM} dims, {n_queries} queries, top-3")
+    for name, ms in results.items():
+        print(f"⏱️ {name:<34} {ms:7.3f} ms/query")
+    print(f"📦 First query (open; NumPy also exports from Chroma): chroma {legs['chroma']['first_ms']:.1f} ms, "
+          f"numpy {legs['numpy']['first_ms']:.1f} ms")
+    print(f"{'✅' if set(opens.values()) == {1} else '⚠️'} Store opens per engine over "
+          f"{4 * n_queries + 1} queries: {opens}")
+    print(f"{'✅' if agree == n_queries else '⚠️'} Same top-3 from both backends for {agree}/{n_queries} queries")
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Version marker for a persistent vector store
+
+Chroma rewrites chroma.sqlite3 whenever a client opens the store, so its
+mtime changes on every open and cannot tell a rebuilt store from a read one.
+Ingest touches a separate marker file instead; readers (RetrievalEngine,
+RetrievalService's cache key) reload only when the marker changes.
+"""
+
+import os
+import time
+
+STORE_VERSION_FILE = "store_version"
+
+
+def store_version(persist_dir: str):
+    """mtime (ns) of the store's ingest marker, None if it was never marked"""
+    try:
+        return os.stat(os.path.join(persist_dir, STORE_VERSION_FILE)).st_mtime_ns
+    except OSError:
+        return None
+
+
+def mark_store_updated(persist_dir: str):
+    """Call after writing to a store so readers pick up the new contents"""
+    os.makedirs(persist_dir, exist_ok=True)
+    with open(os.path.join(persist_dir, STORE_VERSION_FILE), "w") as f:
+        f.write(str(time.time_ns()))
@@ -0,0 +1,117 @@
+"""
+Cached audio device registry with hot-plug recovery
+
+Device names are resolved once against a cached snapshot of PortAudio's device
+list instead of scanning `get_device_count()` on every lookup. When a stream
+dies (e.g. Voicemeeter restarts) `open_with_retry` re-resolves the device and
+reopens it with bounded exponential backoff. PortAudio only sees added or
+re-created devices after re-initialisation, so later attempts also rebuild the
+PyAudio instance - but only while no other stream opened through the registry
+is live, since capture and playback share that instance and terminating it
+would kill the other direction.
+"""
+
+import asyncio
+import pyaudio
+
+
+class DeviceRegistry:
+    """Resolves device names to indexes once and reopens lost devices"""
+
+    def __init__(self, pya=None, factory=pyaudio.PyAudio):
+        self.factory = factory
+        self.pya = pya if pya is not None else factory()
+        self._devices = None
+        self._resolved = {}
+        self._opened = []  # opener results; live while their .stream is set
+
+        # Counters
+        self.scans = 0
+        self.reinitializations = 0
+        self.skipped_reinitializations = 0
+        self.reopens = 0
+        self.failed_opens = 0
+
+    def devices(self) -> list:
+        """Cached device infos (scanned on first use and after rescan)"""
+        if self._devices is None:
+            self.scans += 1
+            self._devices = [self.pya.get_device_info_by_index(i) for i in range(self.pya.get_device_count())]
+        return self._devices
+
+    def find(self, substr: str, kind: str = "input"):
+        """Index of the first input/output device whose name contains `substr`"""
+        key = (substr.lower(), kind)
+        if key in self._resolved:
+            return self._resolved[key]
+        channels = "maxInputChannels" if kind == "input" else "maxOutputChannels"
+        for info in self.devices():
+            if info.get(channels, 0) > 0 and key[0] in info["name"].lower():
+                self._resolved[key] = info["index"]
+                return info["index"]
+        return None
+
+    def info(self, index: int) -> dict:
+        for info in self.devices():
+            if info["index"] == index:
+                return info
+        return self.pya.get_device_info_by_index(index)
+
+    def live_streams(self) -> int:
+        """Streams opened through the registry that have not been closed"""
+        self._opened = [opened for opened in self._opened if getattr(opened, "stream", None) is not None]
+        return len(self._opened)
+
+    def rescan(self, reinitialize: bool = False):
+        """Drop cached lookups; optionally rebuild PyAudio to pick up new devices
+
+        Rebuilding is skipped while another stream is open on the shared instance.
+        """
+        self._devices = None
+        self._resolved.clear()
+        if reinitialize and self.live_streams():
+            self.skipped_reinitializations += 1
+            reinitialize = False
+        if reinitialize and self.factory is not None:
+            self.reinitializations += 1
+            try:
+                self.pya.terminate()
+            except Exception:
+                pass
+            self.pya = self.factory()
+
+    async def open_with_retry(self, substr: str, kind: str, opener, attempts: int = 5,
+                              base_delay_s: float = 0.05, reopen: bool = False):
+        """Resolve `substr` and call `opener(index, info)` in a thread, retrying on failure
+
+        Returns the opener's result, or None once all attempts are used up.
+        """
+        for attempt in range(attempts):
+            if attempt:
+                await asyncio.sleep(base_delay_s * (2 ** (attempt - 1)))
+                # Second failure onwards: the device list itself may be stale
+                self.rescan(reinitialize=attempt >= 2)
+            index = self.find(substr, kind)
+            if index is None:
+                print(f"⚠️ {substr} not found (attempt {attempt + 1}/{attempts})")
+                continue
+            try:
+                result = await asyncio.to_thread(opener, index, self.info(index))
+                if result is not None:
+                    self._opened.append(result)
+                if reopen:
+                    self.reopens += 1
+                return result
+            except Exception as e:
+                print(f"⚠️ Could not open {substr}: {e} (attempt {attempt + 1}/{attempts})")
+        self.failed_opens += 1
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "scans": self.scans,
+            "reinitializations": self.reinitializations,
+            "skipped_reinitializations": self.skipped_reinitializations,
+            "reopens": self.reopens,
+            "failed_opens": self.failed_opens,
+        }
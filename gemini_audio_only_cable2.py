@@ -5,6 +5,7 @@ import os
 import sys
 import traceback
 import pyaudio
+import numpy as np
 import json
 import datetime
 import canvas_ops
@@ -12,10 +13,24 @@ from google import genai
 from dotenv import load_dotenv
 import time
 import socket
-import threading
 import warnings
-# Import RAG functions from chroma_script
-from chroma_db.chroma_script import query_chroma_collection, rag_from_json
+from audio_capture import CallbackCapture
+from audio_vad import VadGate
+from audio_outbound import OutboundAudioScheduler
+from audio_resample import StreamingResampler
+from audio_echo import EchoSuppressor
+from audio_playback import CallbackPlayback
+from audio_bargein import InterruptionController
+from latency_tracer import LatencyTracer
+from device_registry import DeviceRegistry
+from tool_executor import ToolExecutor
+from retrieval_service import RetrievalService
+from http_client import BoardHttpClient
+from canvas_readiness import BoardReadiness
+from tool_registry import ToolRegistry
+from retrieval_prefetch import TranscriptPrefetcher
+from tool_responses import ToolResponseBuilder
+from background_jobs import BackgroundJobs
 load_dotenv()
 
 # Suppress Gemini warnings about non-text parts
@@ -32,6 +47,40 @@ CHANNELS = 1
 SEND_SAMPLE_RATE = 16000
 RECEIVE_SAMPLE_RATE = 24000
 CHUNK_SIZE = 1024
+CAPTURE_QUANTUM = CHUNK_SIZE  # frames per chunk handed to the send path
+VAD_ENABLED = True  # forward speech only, keep-alive during silence
+OUTBOUND_POLICY = "drop_oldest"  # block, drop_oldest or time_compress
+NATIVE_RATE_DEVICES = True  # open devices at their default rate and resample in Python
+ECHO_SUPPRESSION = True  # remove our own playback from the capture stream
+BARGE_IN = True  # cut playback as soon as a participant talks over the assistant
+BARGE_IN_MIN_SPEECH_MS = 180  # consecutive local speech before cutting playback
+LATENCY_REPORT = "latency_report.json"  # per-stage p50/p95/p99, written at exit
+DEVICE_HEALTH_INTERVAL = 0.25  # seconds between stream liveness checks while idle
+DEVICE_STALL_TIMEOUT = 2.0  # seconds without capture data before a device is reopened
+DEVICE_MAX_REOPENS = 20  # per session, across both devices
+
+# Tool execution (runs off the receive loop)
+TOOL_MAX_CONCURRENCY = 4
+TOOL_TIMEOUTS = {
+    "query_chroma_collection": 30.0,
+    "get_canvas_objects": 30.0,
+    "navigate_canvas": 10.0,
+    "generate_task": 10.0,
+    "generate_lab_result": 10.0,
+}
+RETRIEVAL_WORKERS = 2  # threads for Chroma work, separate from the default executor
+CHROMA_STORE = "./chroma_db/chroma_store"
+BOARD_INDEX_STORE = "./chroma_db/board_store"  # persistent board-item index
+VECTOR_BACKEND = "numpy"  # "numpy" (exact, in-process) or "chroma" for both stores
+BOARD_API_URL = "http://localhost:3001"
+CANVAS_READY_TIMEOUT = 5.0  # max wait for a new board item before focusing anyway
+RETRIEVAL_PREFETCH = False  # start medical retrievals from the input transcription (one paid embed + query per pause)
+BACKGROUND_WORKERS = 2  # threads (one event loop each) for agent analysis jobs
+AGENT_JOB_PRIORITY = 5  # lower runs first
+TOOL_RESPONSE_TOKENS = {  # budget for the retrieved text in each response
+    "query_chroma_collection": 600,
+    "get_canvas_objects": 600,
+}
 
 # Gemini configuration
 MODEL = "models/gemini-2.0-flash-live-001"
@@ -289,6 +338,8 @@ CONFIG = {
         "language_code": "en-GB"
     }
 }
+if RETRIEVAL_PREFETCH:
+    CONFIG["input_audio_transcription"] = {}
 # Initialize PyAudio
 pya = pyaudio.PyAudio()
 
@@ -298,7 +349,24 @@ class AudioOnlyGeminiCable:
         self.out_queue = None
         self.session = None
         self.audio_stream = None
+        self.capture = None
+        self.echo = EchoSuppressor(SEND_SAMPLE_RATE, reference_rate=RECEIVE_SAMPLE_RATE) if ECHO_SUPPRESSION else None
+        self.vad = VadGate(SEND_SAMPLE_RATE) if VAD_ENABLED else None
         self.output_stream = None
+        self.playback = None
+        self.barge_in = None
+        self.barge_in_vad = None if VAD_ENABLED else VadGate(SEND_SAMPLE_RATE)
+        self.tracer = LatencyTracer()
+        self.devices = DeviceRegistry(pya)
+        self.tool_executor = None
+        self.http = BoardHttpClient(BOARD_API_URL)
+        self.retrieval = RetrievalService(persist_dir=CHROMA_STORE, max_workers=RETRIEVAL_WORKERS, http=self.http,
+                                          board_dir=BOARD_INDEX_STORE, backend=VECTOR_BACKEND)
+        self.canvas_ready = BoardReadiness(self.retrieval.fetch_board_items, timeout_s=CANVAS_READY_TIMEOUT)
+        self.responses = ToolResponseBuilder(TOOL_RESPONSE_TOKENS)
+        self.jobs = BackgroundJobs(max_workers=BACKGROUND_WORKERS, error_message=self.background_error_message)
+        self.tools = self.build_tool_registry()
+        self.prefetch = TranscriptPrefetcher(self.retrieval.medical) if RETRIEVAL_PREFETCH else None
         self.function_call_count = 0
         self.last_function_call_time = None
         
@@ -321,74 +389,22 @@ class AudioOnlyGeminiCable:
     async def handle_tool_call(self, tool_call):
         """Handle tool calls from Gemini according to official documentation"""
         try:
-            from google.genai import types
-            
             # Track function calls
             self.function_call_count += 1
             self.last_function_call_time = datetime.datetime.now()
             
             print(f"🔧 Function Call #{self.function_call_count}")
             
-            # Process each function call in the tool call
-            function_responses = []
-            for fc in tool_call.function_calls:
-                function_name = fc.name
-                arguments = fc.args
-                
-                print(f"  📋 {function_name}: {json.dumps(arguments, indent=2)[:100]}...")
-                
-                # Create action data for saving
-                action_data = {
-                    "function_name": function_name,
-                    "arguments": arguments,
-                    "timestamp": datetime.datetime.now().isoformat()
-                }
-                
-                # Save the function call to file (non-blocking)
-                asyncio.create_task(self.save_function_call(arguments))
-                
-                # Create function response with actual RAG processing
-                if fc.name == "query_chroma_collection":
-                    query = arguments.get('query', '')
-                    rag_result = self.query_medical_database(query)
-                    print("RAG Result :",rag_result[:200])
-                    fun_res = {
-                        "result": {
-                            "status": "Medical query processed",
-                            "action": "Retrieved medical information",
-                            "query": query,
-                            "medical_data": rag_result,
-                            "message": f"I've retrieved relevant medical information for your query: '{query}'. Here's what I found: {rag_result}",
-                            "explanation": f"Medical query '{query}' processed successfully. Retrieved relevant patient medical data, lab results, and clinical information."
-                        }
-                    }
-                elif fc.name == "get_canvas_objects":
-                    query = arguments.get('query', '')
-                    canvas_result = self.get_canvas_objects(query)
-                    print("RAG Result Canvas:",canvas_result[:200])
-
-                    fun_res = {
-                        "result": {
-                            "status": "Canvas objects retrieved",
-                            "action": "Retrieved canvas items",
-                            "query": query,
-                            "canvas_data": canvas_result,
-                            "message": f"I've retrieved relevant canvas objects for your query: '{query}'. Here's what I found: {canvas_result}",
-                            "explanation": f"Canvas query '{query}' processed successfully. Retrieved relevant canvas items and objects for navigation."
-                        }
-                    }
-                else:
-                    fun_res = self.get_function_response(arguments)
-                
-                function_response = types.FunctionResponse(
-                    id=fc.id,
-                    name=fc.name,
-                    response=fun_res
-                )
-                function_responses.append(function_response)
+            # Run every function call of this tool call concurrently
+            function_responses = await asyncio.gather(
+                *(self.run_function_call(fc) for fc in tool_call.function_calls)
+            )
             
             # Send tool response back to Gemini
             await self.session.send_tool_response(function_responses=function_responses)
+            if self.tool_executor:
+                self.tool_executor.responded(tool_call)
+            self.tracer.mark("tool_done")
             print("  ✅ Response sent")
             
             # Add a delay to ensure the tool response is processed
@@ -416,220 +432,283 @@ class AudioOnlyGeminiCable:
             except Exception as error_send_error:
                 print(f"❌ Error recovery failed: {error_send_error}")
 
-    def get_function_response(self, arguments):
-        if 'objectId' in arguments:
-            return { 
-                "result": {
-                    "status": "Canvas navigation completed",
-                    "action": "Moved viewport to target object",
-                    "message": "I've successfully navigated to the requested canvas object. The viewport has been moved to focus on this item. You can now see the relevant information displayed on the canvas.",
-                    "explanation": "Navigation completed successfully. The canvas view has been updated to show the requested object with all relevant details."
-                }
-            }
-        elif 'parameter' in arguments:
-            return { 
-                "result": {
-                    "status": "Lab result generated",
-                    "action": "Created lab result for medical parameter",
-                    "parameter": arguments.get('parameter', 'Unknown'),
-                    "value": arguments.get('value', 'N/A'),
-                    "unit": arguments.get('unit', ''),
-                    "status_level": arguments.get('status', 'Normal'),
-                    "message": f"I've successfully generated a lab result for {arguments.get('parameter', 'the requested parameter')}: {arguments.get('value', 'N/A')} {arguments.get('unit', '')} (Status: {arguments.get('status', 'Normal')}). The result is now displayed on the canvas for your review.",
-                    "explanation": f"Lab result created for {arguments.get('parameter', 'parameter')} with value {arguments.get('value', 'N/A')} {arguments.get('unit', '')}. Status: {arguments.get('status', 'Normal')}. The result has been added to the canvas for analysis."
-                }
+    async def send_tool_timeout(self, tool_call):
+        """Answer every function call of a timed-out tool call with an error"""
+        from google.genai import types
+        function_responses = [
+            types.FunctionResponse(
+                id=fc.id,
+                name=fc.name,
+                response={"error": f"{fc.name} timed out, please try again"}
+            )
+            for fc in tool_call.function_calls
+        ]
+        await self.session.send_tool_response(function_responses=function_responses)
+
+    async def run_function_call(self, fc):
+        """Run one function call and build its FunctionResponse"""
+        from google.genai import types
+        
+        print(f"  📋 {fc.name}: {json.dumps(fc.args, indent=2)[:100]}...")
+        start = time.monotonic()
+        fun_res = await self.tools.dispatch(fc.name, fc.args)
+        print(f"  ⏱️ {fc.name}: {(time.monotonic() - start) * 1000:.0f} ms")
+        
+        return types.FunctionResponse(
+            id=fc.id,
+            name=fc.name,
+            response=fun_res
+        )
+
+    def build_tool_registry(self):
+        """Map every declared function to its response builder and canvas pipeline"""
+        tools = ToolRegistry(FUNCTION_DECLARATIONS)
+        tools.register("navigate_canvas", self.navigation_response, side_effect=self.focus_canvas_item)
+        tools.register("generate_task", self.task_response, side_effect=self.create_task_item)
+        # The model is asked for a full result; anything but the parameter falls back to the handler's defaults
+        tools.register("generate_lab_result", self.lab_result_response, side_effect=self.create_lab_item,
+                       required=["parameter"])
+        tools.register("query_chroma_collection", self.medical_query_response)
+        tools.register("get_canvas_objects", self.canvas_query_response)
+        tools.check()
+        return tools
+
+    async def medical_query_response(self, arguments):
+        query = arguments.get('query', '')
+        rag_result = await self.query_medical_database(query)
+        response = self.responses.retrieval("query_chroma_collection", "Medical query processed",
+                                            "medical_data", query, rag_result)
+        print("RAG Result :",response["result"]["medical_data"][:200])
+        return response
+
+    async def canvas_query_response(self, arguments):
+        query = arguments.get('query', '')
+        canvas_result = await self.get_canvas_objects(query)
+        response = self.responses.retrieval("get_canvas_objects", "Canvas objects retrieved",
+                                            "canvas_data", query, canvas_result)
+        print("RAG Result Canvas:",response["result"]["canvas_data"][:200])
+        return response
+
+    def navigation_response(self, arguments):
+        return { 
+            "result": {
+                "status": "Canvas navigation completed",
+                "action": "Moved viewport to target object",
+                "message": "I've successfully navigated to the requested canvas object. The viewport has been moved to focus on this item. You can now see the relevant information displayed on the canvas.",
+                "explanation": "Navigation completed successfully. The canvas view has been updated to show the requested object with all relevant details."
             }
-        elif 'query' in arguments and len(arguments) == 1:
-            # This is either query_chroma_collection or get_canvas_objects
-            query = arguments.get('query', '')
-            # We need to determine which function was called based on context
-            # For now, we'll handle both cases and let the actual function call determine the response
-            return {
-                "result": {
-                    "status": "Query processed",
-                    "action": "Retrieved relevant information",
-                    "query": query,
-                    "message": f"I've processed your query: '{query}'. The relevant information has been retrieved and will be used to provide you with a comprehensive answer.",
-                    "explanation": f"Query '{query}' has been processed successfully. The system has retrieved relevant information to answer your question."
-                }
+        }
+
+    def lab_result_response(self, arguments):
+        return { 
+            "result": {
+                "status": "Lab result generated",
+                "action": "Created lab result for medical parameter",
+                "parameter": arguments.get('parameter', 'Unknown'),
+                "value": arguments.get('value', 'N/A'),
+                "unit": arguments.get('unit', ''),
+                "status_level": arguments.get('status', 'Normal'),
+                "message": f"I've successfully generated a lab result for {arguments.get('parameter', 'the requested parameter')}: {arguments.get('value', 'N/A')} {arguments.get('unit', '')} (Status: {arguments.get('status', 'Normal')}). The result is now displayed on the canvas for your review.",
+                "explanation": f"Lab result created for {arguments.get('parameter', 'parameter')} with value {arguments.get('value', 'N/A')} {arguments.get('unit', '')}. Status: {arguments.get('status', 'Normal')}. The result has been added to the canvas for analysis."
             }
-        else:
-            # For task creation, include the actual task details
-            task_title = arguments.get('title', 'New Task')
-            task_content = arguments.get('content', 'Task created')
-            task_items = arguments.get('items', [])
-            
-            return {
-                "result": {
-                    "status": "Task created successfully",
-                    "action": "Created task with detailed analysis",
-                    "title": task_title,
-                    "content": task_content,
-                    "items": task_items,
-                    "message": f"I've successfully created your confirmed task: '{task_title}'. {task_content}. The task includes {len(task_items)} step-by-step items. IMPORTANT: This task will be executed and analyzed by a Data Analyst Agent in the background. You'll receive detailed analysis results shortly.",
-                    "explanation": f"Task '{task_title}' created with {len(task_items)} step-by-step items. Background execution initiated - Data Analyst Agent will process this task and provide comprehensive analysis.",
-                    "executed_by": "Data Analyst Agent",
-                    "execution_mode": "background",
-                    "background_processing": "Data Analyst Agent will analyze the task and provide detailed results in the background"
-                }
+        }
+
+    def task_response(self, arguments):
+        # For task creation, include the actual task details
+        task_title = arguments.get('title', 'New Task')
+        task_content = arguments.get('content', 'Task created')
+        task_items = arguments.get('items', [])
+        
+        return {
+            "result": {
+                "status": "Task created successfully",
+                "action": "Created task with detailed analysis",
+                "title": task_title,
+                "content": task_content,
+                "items": task_items,
+                "message": f"I've successfully created your confirmed task: '{task_title}'. {task_content}. The task includes {len(task_items)} step-by-step items. IMPORTANT: This task will be executed and analyzed by a Data Analyst Agent in the background. You'll receive detailed analysis results shortly.",
+                "explanation": f"Task '{task_title}' created with {len(task_items)} step-by-step items. Background execution initiated - Data Analyst Agent will process this task and provide comprehensive analysis.",
+                "executed_by": "Data Analyst Agent",
+                "execution_mode": "background",
+                "background_processing": "Data Analyst Agent will analyze the task and provide detailed results in the background"
             }
+        }
 
-    def query_medical_database(self, query):
-        """Query the medical database using RAG"""
+    async def query_medical_database(self, query):
+        """Query the medical database using RAG (reusing a transcript prefetch for the same query)"""
         try:
-            result = query_chroma_collection(query, persist_dir="./chroma_db/chroma_store", top_k=3)
+            result = await self.claim_prefetch(query)
+            if result is None:
+                result = await self.retrieval.medical(query)
             return result if result else "No relevant medical information found for this query."
         except Exception as e:
             print(f"Error querying medical database: {e}")
             return f"Error retrieving medical information: {str(e)}"
 
-    def get_canvas_objects(self, query):
-        """Get canvas objects using RAG from JSON"""
+    async def claim_prefetch(self, query):
+        """Result of a transcript prefetch for exactly `query`, or None to retrieve afresh
+
+        The prefetch task is shared: shielded so cancelling this tool call does
+        not cancel it, and its failure falls back to a fresh retrieval.
+        """
+        prefetched = self.prefetch.claim(query) if self.prefetch else None
+        if prefetched is None:
+            return None
         try:
-            result = rag_from_json("./chroma_db/boardItems.json", query, top_k=3)
+            return await asyncio.shield(prefetched)
+        except asyncio.CancelledError:
+            if not prefetched.cancelled():
+                raise  # this tool call was cancelled, not the prefetch
+        except Exception as e:
+            print(f"⚠️ Prefetched retrieval failed, retrieving again: {e}")
+        return None
+
+    async def get_canvas_objects(self, query):
+        """Get canvas objects using RAG from the live board items"""
+        try:
+            result = await self.retrieval.canvas(query)
             return result if result else "No relevant canvas objects found for this query."
         except Exception as e:
             print(f"Error getting canvas objects: {e}")
             return f"Error retrieving canvas objects: {str(e)}"
 
     def start_background_agent_processing(self, action_data):
-        """Start agent processing in background using threading (no asyncio.create_task)"""
-        def run_agent_processing():
-            try:
-                # Create new event loop for this thread
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                
-                # Run the agent processing
-                loop.run_until_complete(self._handle_agent_processing(action_data))
-                
-            except Exception as e:
-                print(f"❌ Error in background agent processing thread: {e}")
-            finally:
-                loop.close()
-        
-        # Start the background processing in a separate thread
-        thread = threading.Thread(target=run_agent_processing, daemon=True)
-        thread.start()
-        print(f"  🔄 Background processing started")
+        """Queue agent processing on the shared background pool"""
+        job_id = self.jobs.submit(self._handle_agent_processing, action_data,
+                                  priority=AGENT_JOB_PRIORITY, name="agent_analysis")
+        print(f"  🔄 Background processing queued (job {job_id})")
 
     async def _handle_agent_processing(self, action_data):
-        """Handle agent processing in background"""
-        try:
-            agent_res = await canvas_ops.get_agent_answer(action_data)
-            await asyncio.sleep(2)
-            create_agent_res = await canvas_ops.create_result(agent_res)
-            print(f"  ✅ Analysis completed")
-            
-            
-                
-        except Exception as e:
-            print(f"❌ Background processing error: {e}")
-            # Send error info to Gemini
-            error_message = f"BACKGROUND PROCESSING ERROR: The Data Analyst Agent encountered an error while processing your task: {str(e)}"
-            try:
-                await self.session.send(input=error_message)
-                print(f"  📝 Error message sent to Gemini")
-            except Exception as error_send_error:
-                print(f"⚠️ Could not send error message: {error_send_error}")
-
-    async def save_function_call(self, action_data):
-        """Save the function call to a file"""
-        if not action_data:
-            return
-        if 'objectId' in action_data:
-            focus_res = await canvas_ops.focus_item(action_data["objectId"])
-            print(f"  🎯 Navigation completed")
-        elif 'parameter' in action_data:
-            lab_res = await canvas_ops.create_lab(action_data)
-            await asyncio.sleep(2)
-            labId = lab_res['id']
-            focus_res = await canvas_ops.focus_item(labId)
-            print(f"  🧪 Lab result created")
-        elif 'query' in action_data and len(action_data) == 1:
-            # Handle RAG function calls
-            query = action_data.get('query', '')
-            print(f"  🔍 RAG query processed: {query[:50]}...")
-            # The actual RAG processing will be handled by the function response
-        else:
-            action_data['area'] = "planning-zone"
-            task_res = await canvas_ops.create_todo(action_data)
-            await asyncio.sleep(3)
-            boxId = task_res['id']
-            focus_res = await canvas_ops.focus_item(boxId)
-            print(f"  📝 Task created")
-
-            # Trigger agent processing in background
-            self.start_background_agent_processing(action_data)
-            
+        """Handle agent processing in background (runs on a background worker's loop)"""
+        # The todo is already on the board (create_task_item waited for it)
+        agent_res = await canvas_ops.get_agent_answer(action_data)
+        create_agent_res = await canvas_ops.create_result(agent_res)
+        print(f"  ✅ Analysis completed")
 
+    def background_error_message(self, job, error):
+        """Session message for a failed background job"""
+        return f"BACKGROUND PROCESSING ERROR: The Data Analyst Agent encountered an error while processing your task: {str(error)}"
 
-        try:
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"function_call_object/gemini_function_call_{timestamp}.json"
-            
-            # with open(filename, 'w') as f:
-            #     json.dump(action_data, f, indent=2)
-            
-            # print(f"💾 Function call saved to: {filename}")
-            # print(f"📄 Content: {json.dumps(action_data, indent=2)}")
-            
-        except Exception as e:
-            print(f"❌ Error saving function call: {e}")
+    async def send_background_message(self, text):
+        """Single writer for background results into the live session"""
+        await self.session.send(input=text)
+        print(f"  📝 Background message sent to Gemini")
 
+    async def focus_canvas_item(self, action_data):
+        """navigate_canvas: move the viewport to the object"""
+        await canvas_ops.focus_item(action_data["objectId"])
+        print(f"  🎯 Navigation completed")
+
+    async def create_lab_item(self, action_data):
+        """generate_lab_result: add the lab card and focus it once the board lists it"""
+        lab_res = await canvas_ops.create_lab(action_data)
+        labId = lab_res['id']
+        await self.canvas_ready.wait_for(labId)
+        self.retrieval.cache.invalidate("canvas")
+        await canvas_ops.focus_item(labId)
+        print(f"  🧪 Lab result created")
+
+    async def create_task_item(self, action_data):
+        """generate_task: add the todo, focus it and hand it to the analyst agent"""
+        action_data['area'] = "planning-zone"
+        task_res = await canvas_ops.create_todo(action_data)
+        boxId = task_res['id']
+        await self.canvas_ready.wait_for(boxId)
+        self.retrieval.cache.invalidate("canvas")
+        await canvas_ops.focus_item(boxId)
+        print(f"  📝 Task created")
+
+        # Trigger agent processing in background
+        self.start_background_agent_processing(action_data)
 
     def find_input_device(self, substr: str) -> int:
         """Find input device by substring"""
-        s = substr.lower()
-        for i in range(pya.get_device_count()):
-            info = pya.get_device_info_by_index(i)
-            if info['maxInputChannels'] > 0 and s in info['name'].lower():
-                return i
-        return None
+        return self.devices.find(substr, "input")
 
     def find_output_device(self, substr: str) -> int:
         """Find output device by substring"""
-        s = substr.lower()
-        for i in range(pya.get_device_count()):
-            info = pya.get_device_info_by_index(i)
-            if info['maxOutputChannels'] > 0 and s in info['name'].lower():
-                return i
-        return None
+        return self.devices.find(substr, "output")
 
     async def listen_audio(self):
         """Listen to CABLE Output (Google Meet audio) and send to Gemini"""
         print("🎤 Starting audio capture...")
+        loop = asyncio.get_running_loop()
         
-        # Find CABLE Output device
-        input_device_index = self.find_input_device("CABLE Output")
-        if input_device_index is None:
-            print("❌ CABLE Output device not found!")
-            return
-        
-        input_info = pya.get_device_info_by_index(input_device_index)
-        print(f"🎤 Using: {input_info['name']}")
+        def open_capture(index, info):
+            print(f"🎤 Using: {info['name']}")
+            # Open the device at its native rate and convert to 16 kHz ourselves
+            capture_rate = int(info['defaultSampleRate']) if NATIVE_RATE_DEVICES else SEND_SAMPLE_RATE
+            native_quantum = CAPTURE_QUANTUM * capture_rate // SEND_SAMPLE_RATE
+            # Open audio stream in callback mode
+            capture = CallbackCapture(
+                self.devices.pya,
+                index,
+                rate=capture_rate,
+                channels=CHANNELS,
+                frames_per_buffer=native_quantum,
+                quantum=native_quantum,
+            )
+            capture.start(loop)
+            return capture
         
-        # Open audio stream
-        self.audio_stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=SEND_SAMPLE_RATE,
-            input=True,
-            input_device_index=input_device_index,
-            frames_per_buffer=CHUNK_SIZE,
-        )
-        
-        print("🎤 Audio ready!")
-        
-        # Read audio chunks and send to Gemini
+        reopen = False
         while True:
+            # Find CABLE Output device and open it (retried if the device blips)
+            self.capture = await self.devices.open_with_retry("CABLE Output", "input", open_capture, reopen=reopen)
+            if self.capture is None:
+                print("❌ CABLE Output device not found!")
+                return
+            self.audio_stream = self.capture.stream
+            
+            resampler = None
+            if self.capture.rate != SEND_SAMPLE_RATE:
+                resampler = StreamingResampler(self.capture.rate, SEND_SAMPLE_RATE)
+                print(f"🎤 Resampling {self.capture.rate} Hz -> {SEND_SAMPLE_RATE} Hz")
+            
+            print("🎤 Audio ready!")
+            
+            # Read audio chunks and send to Gemini
+            stalled = 0.0
+            while True:
+                try:
+                    data = await asyncio.wait_for(self.capture.read(), timeout=DEVICE_HEALTH_INTERVAL)
+                    stalled = 0.0
+                    captured_at = time.monotonic()
+                    if resampler:
+                        data = resampler.process_int16(data)
+                    if self.echo:
+                        data = self.echo.process(data)
+                    chunks = self.vad.process(data) if self.vad else [data]
+                    is_speech = self.vad.last_speech if self.vad else self.barge_in_vad.is_speech(np.frombuffer(data, dtype=np.int16))
+                    if self.barge_in:
+                        # Echo-gated: residual echo while the canceller converges is not a barge-in
+                        near_end = self.echo.near_end_speech(is_speech) if self.echo else is_speech
+                        self.barge_in.on_capture(near_end, captured_at, len(data) / 2 / SEND_SAMPLE_RATE * 1000)
+                    if is_speech:
+                        self.tracer.mark_capture(captured_at)
+                    for chunk in chunks:
+                        await self.out_queue.put({"data": chunk, "mime_type": "audio/pcm", "captured_at": captured_at})
+                    if self.vad and self.vad.segment_ended:
+                        # Gate closed after speech: let the server's VAD end the turn now
+                        await self.out_queue.put({"audio_stream_end": True})
+                except asyncio.TimeoutError:
+                    stalled += DEVICE_HEALTH_INTERVAL
+                    if self.capture.stream.is_active() and stalled < DEVICE_STALL_TIMEOUT:
+                        continue
+                    print("⚠️ Capture device lost - reopening CABLE Output")
+                    break
+                except Exception as e:
+                    print(f"❌ Error reading audio: {e}")
+                    break
+            
             try:
-                data = await asyncio.to_thread(self.audio_stream.read, CHUNK_SIZE, exception_on_overflow=False)
-                await self.out_queue.put({"data": data, "mime_type": "audio/pcm"})
-            except Exception as e:
-                print(f"❌ Error reading audio: {e}")
-                break
+                self.capture.close()
+            except Exception:
+                pass
+            if self.devices.reopens >= DEVICE_MAX_REOPENS:
+                print("❌ Capture device keeps failing, giving up")
+                return
+            reopen = True
 
     async def receive_audio(self):
         """Receive audio responses from Gemini"""
@@ -639,13 +718,28 @@ class AudioOnlyGeminiCable:
             try:
                 turn = self.session.receive()
                 async for response in turn:
+                    server_content = getattr(response, 'server_content', None)
+                    # Only model output counts: input transcription arrives while the participant still speaks
+                    if response.data or getattr(response, 'tool_call', None) or getattr(server_content, 'model_turn', None):
+                        self.tracer.mark("first_server_byte")
                     # Handle audio data
                     if data := response.data:
-                        self.audio_in_queue.put_nowait(data)
+                        if not self.barge_in or self.barge_in.accept_audio():
+                            self.audio_in_queue.put_nowait(data)
                         # Reduced logging - only log occasionally
                         # if self.function_call_count % 10 == 0:  # Log every 10th audio chunk
                         #     print(f"🔊 Audio: {len(data)} bytes")
                     
+                    # Participant talked over the assistant
+                    if self.barge_in and server_content and server_content.interrupted:
+                        print("✋ Interrupted by participant")
+                        self.barge_in.on_server_interrupted()
+                    
+                    # Participant's words, streamed while they speak
+                    transcription = getattr(server_content, 'input_transcription', None)
+                    if self.prefetch and transcription and transcription.text:
+                        self.prefetch.on_transcript(transcription.text)
+                    
                     # Handle text responses (print them)
                     # if text := response.text:
                     #     print(f"💬 Gemini: {text}")
@@ -659,7 +753,9 @@ class AudioOnlyGeminiCable:
                     if hasattr(response, 'tool_call'):
                         if response.tool_call:
                             print("🔧 TOOL CALL DETECTED!")
-                            await self.handle_tool_call(response.tool_call)
+                            self.tracer.mark("first_tool_call")
+                            # Run the tool off the receive loop so audio keeps flowing
+                            self.tool_executor.submit(response.tool_call)
                             function_call_detected = True
                         # else:
                         #     print("🔍 tool_call exists but is None/False")
@@ -708,9 +804,14 @@ class AudioOnlyGeminiCable:
                     #             except Exception as force_reset_error:
                     #                 print(f"⚠️ Force reset failed: {force_reset_error}")
                 
-                # Clear audio queue on turn completion to prevent overlap
-                while not self.audio_in_queue.empty():
-                    self.audio_in_queue.get_nowait()
+                # Overlap is handled by the barge-in controller; without it, clear
+                # the audio queue on turn completion as before
+                if self.barge_in:
+                    self.barge_in.on_turn_complete()
+                else:
+                    while not self.audio_in_queue.empty():
+                        self.audio_in_queue.get_nowait()
+                self.tracer.finish_turn()
                     
             except Exception as e:
                 print(f"❌ Error receiving audio: {e}")
@@ -720,44 +821,80 @@ class AudioOnlyGeminiCable:
         """Play audio responses to CABLE Input (Google Meet will hear this)"""
         print("🔊 Setting up audio output...")
         
-        # Find CABLE Input device
-        output_device_index = self.find_output_device("Voicemeeter Input")
-        if output_device_index is None:
-            print("❌ Output device not found!")
-            return
-        
-        output_info = pya.get_device_info_by_index(output_device_index)
-        print(f"🔊 Using: {output_info['name']}")
-        
-        # Open output stream
-        stream = await asyncio.to_thread(
-            pya.open,
-            format=FORMAT,
-            channels=CHANNELS,
-            rate=RECEIVE_SAMPLE_RATE,
-            output=True,
-            output_device_index=output_device_index,
-        )
+        # Echo reference is taken from the frames the device actually plays
+        on_played = None
+        if self.echo:
+            loop = asyncio.get_running_loop()
+            on_played = lambda data: loop.call_soon_threadsafe(self.echo.push_reference, data)
         
-        print("🔊 Audio output ready!")
+        def open_playback(index, info):
+            print(f"🔊 Using: {info['name']}")
+            # Open the device at its native rate and convert from 24 kHz ourselves
+            playback_rate = int(info['defaultSampleRate']) if NATIVE_RATE_DEVICES else RECEIVE_SAMPLE_RATE
+            # Open output stream in callback mode behind a jitter buffer
+            playback = CallbackPlayback(self.devices.pya, index, playback_rate, on_played=on_played)
+            playback.start()
+            return playback
         
-        # Play audio from queue with proper buffering
+        reopen = False
         while True:
+            # Find output device and open it (retried if the device blips)
+            self.playback = await self.devices.open_with_retry("Voicemeeter Input", "output", open_playback, reopen=reopen)
+            if self.playback is None:
+                print("❌ Output device not found!")
+                return
+            self.output_stream = self.playback.stream
+            
+            resampler = None
+            if self.playback.rate != RECEIVE_SAMPLE_RATE:
+                resampler = StreamingResampler(RECEIVE_SAMPLE_RATE, self.playback.rate)
+                print(f"🔊 Resampling {RECEIVE_SAMPLE_RATE} Hz -> {self.playback.rate} Hz")
+            if self.echo:
+                self.echo.set_reference_rate(self.playback.rate)
+            if self.barge_in:
+                self.barge_in.attach(self.playback)
+            
+            print("🔊 Audio output ready!")
+            
+            # Move received audio into the jitter buffer as soon as it arrives
+            while True:
+                try:
+                    bytestream = await asyncio.wait_for(self.audio_in_queue.get(), timeout=DEVICE_HEALTH_INTERVAL)
+                except asyncio.TimeoutError:
+                    bytestream = None
+                try:
+                    if not self.playback.stream.is_active():
+                        print("⚠️ Playback device lost - reopening Voicemeeter Input")
+                        break
+                    if bytestream is None:
+                        continue
+                    if resampler:
+                        bytestream = resampler.process_int16(bytestream)
+                    self.playback.write(bytestream)
+                    self.tracer.mark("first_playback")
+                except Exception as e:
+                    print(f"❌ Error playing audio: {e}")
+                    break
+            
             try:
-                bytestream = await self.audio_in_queue.get()
-                await asyncio.to_thread(stream.write, bytestream)
-                # Add small delay to ensure proper audio streaming
-                await asyncio.sleep(0.01)
-            except Exception as e:
-                print(f"❌ Error playing audio: {e}")
-                break
+                self.playback.close()
+            except Exception:
+                pass
+            if self.devices.reopens >= DEVICE_MAX_REOPENS:
+                print("❌ Playback device keeps failing, giving up")
+                return
+            reopen = True
 
     async def send_audio_to_gemini(self):
         """Send audio data to Gemini"""
         while True:
             try:
                 audio_data = await self.out_queue.get()
+                if audio_data.get("audio_stream_end"):
+                    await self.session.send_realtime_input(audio_stream_end=True)
+                    continue
                 await self.session.send(input=audio_data)
+                self.tracer.mark_sent(self.out_queue.last_captured_at)
             except Exception as e:
                 print(f"❌ Error sending audio: {e}")
                 break
@@ -794,7 +931,15 @@ class AudioOnlyGeminiCable:
                 
                 # Create queues
                 self.audio_in_queue = asyncio.Queue()
-                self.out_queue = asyncio.Queue(maxsize=10)
+                self.barge_in = InterruptionController(self.audio_in_queue, BARGE_IN_MIN_SPEECH_MS) if BARGE_IN else None
+                self.tool_executor = ToolExecutor(
+                    self.handle_tool_call,
+                    on_timeout=self.send_tool_timeout,
+                    max_concurrency=TOOL_MAX_CONCURRENCY,
+                    timeouts=TOOL_TIMEOUTS,
+                )
+                self.out_queue = OutboundAudioScheduler(SEND_SAMPLE_RATE, maxsize=10, policy=OUTBOUND_POLICY)
+                self.jobs.start(writer=self.send_background_message)
                 
                 print("🔗 Connected to Gemini Live API with system prompt")
                 
@@ -817,9 +962,44 @@ class AudioOnlyGeminiCable:
             print(f"❌ Error: {e}")
             traceback.print_exc()
         finally:
+            # Cancel tool calls still running
+            if self.tool_executor:
+                await self.tool_executor.shutdown()
+                print(f"🔧 Tool executor stats: {self.tool_executor.stats()}")
+            await self.tools.shutdown()
+            await self.jobs.shutdown()
+            print(f"🧵 Background job stats: {self.jobs.stats()}")
+            for name, tool in self.tools.tools.items():
+                print(f"⏱️ {name}: {tool.stats()}")
+            if self.prefetch:
+                self.prefetch.reset()
+                print(f"🔮 Prefetch stats: {self.prefetch.stats()}")
+            print(f"📚 Retrieval stats: {self.retrieval.stats()}")
+            print(f"🌐 Board HTTP stats: {self.http.stats()}")
+            print(f"📏 Tool response sizes: {self.responses.stats()}")
+            print(f"🧭 Canvas readiness stats: {self.canvas_ready.stats()}")
+            await self.retrieval.close()
             # Clean up audio stream
-            if self.audio_stream:
-                self.audio_stream.close()
+            if self.capture:
+                print(f"🎤 Capture stats: {self.capture.stats()}")
+                self.capture.close()
+            print(f"🎛️ Device stats: {self.devices.stats()}")
+            if self.barge_in:
+                print(f"✋ Barge-in stats: {self.barge_in.stats()}")
+            if self.playback:
+                print(f"🔊 Playback stats: {self.playback.stats()}")
+                self.playback.close()
+            if self.echo:
+                print(f"🔁 Echo suppression stats: {self.echo.stats()}")
+            if self.vad:
+                print(f"🗣️ VAD stats: {self.vad.stats()}")
+            if self.out_queue:
+                print(f"📤 Outbound stats: {self.out_queue.stats()}")
+            try:
+                self.tracer.dump_json(LATENCY_REPORT)
+                print(f"⏱️ Latency report saved to: {LATENCY_REPORT}")
+            except Exception as e:
+                print(f"❌ Error saving latency report: {e}")
             print("🧹 Cleanup completed")
 
 def main():
@@ -840,6 +1020,5 @@ def main():
     gemini = AudioOnlyGeminiCable()
     asyncio.run(gemini.run())
 
-# if __name__ == "__main__":
-#     main()
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
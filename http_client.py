@@ -0,0 +1,188 @@
+"""
+Pooled keep-alive HTTP client for the board API
+
+Every board round trip used to open a fresh connection (`requests.get` without
+a session, a new aiohttp session per service). `BoardHttpClient` keeps one
+aiohttp session per client with a pooled, keep-alive connector, so repeated
+calls to localhost:3001 reuse warm connections instead of paying TCP setup.
+It adds:
+
+- a total timeout per request
+- retries with full jitter on connection errors, timeouts and 429/502/503/504
+  (idempotent methods only unless asked)
+- per-endpoint latency histograms plus counters for opened vs reused
+  connections
+
+aiohttp speaks HTTP/1.1 without pipelining; keep-alive reuse is what removes
+the per-request connection cost here. Use the client from the loop that
+created it (the session's loop).
+
+Run this file directly to compare pooled and fresh-connection requests against
+a local stand-in board server.
+"""
+
+import asyncio
+import random
+import time
+from latency_tracer import RollingHistogram
+
+RETRY_STATUSES = frozenset((429, 502, 503, 504))
+IDEMPOTENT = frozenset(("GET", "HEAD", "PUT", "DELETE", "OPTIONS"))
+
+
+class HttpStatusError(Exception):
+    def __init__(self, status, url):
+        super().__init__(f"HTTP {status} from {url}")
+        self.status = status
+
+
+class BoardHttpClient:
+    """Shared aiohttp session with pooling, timeouts, jittered retries and metrics"""
+
+    def __init__(self, base_url="http://localhost:3001", timeout_s=5.0, retries=2,
+                 backoff_s=0.05, max_backoff_s=1.0, pool_size=8, keepalive_s=30.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout_s = timeout_s
+        self.retries = retries
+        self.backoff_s = backoff_s
+        self.max_backoff_s = max_backoff_s
+        self.pool_size = pool_size
+        self.keepalive_s = keepalive_s
+        self._session = None
+        self.latency = {}
+
+        # Metrics
+        self.requests = 0
+        self.retried = 0
+        self.failures = 0
+        self.connections_opened = 0
+        self.connections_reused = 0
+
+    def _http(self):
+        import aiohttp
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_connection_create_end.append(self._on_connection_opened)
+            trace.on_connection_reuseconn.append(self._on_connection_reused)
+            connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_s)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout_s),
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def _on_connection_opened(self, session, context, params):
+        self.connections_opened += 1
+
+    async def _on_connection_reused(self, session, context, params):
+        self.connections_reused += 1
+
+    async def request(self, method: str, path: str, retry=None, **kwargs):
+        """Send a request and return the decoded JSON body (or text)"""
+        import aiohttp
+
+        method = method.upper()
+        retry = method in IDEMPOTENT if retry is None else retry
+        url = path if path.startswith("http") else self.base_url + path
+        endpoint = f"{method} {path.split('?')[0]}"
+        attempts = 1 + (self.retries if retry else 0)
+        for attempt in range(attempts):
+            self.requests += 1
+            start = time.monotonic()
+            try:
+                async with self._http().request(method, url, **kwargs) as response:
+                    if response.status in RETRY_STATUSES:
+                        raise HttpStatusError(response.status, url)
+                    response.raise_for_status()
+                    if response.content_type == "application/json":
+                        body = await response.json()
+                    else:
+                        body = await response.text()
+                self.latency.setdefault(endpoint, RollingHistogram()).add((time.monotonic() - start) * 1000)
+                return body
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError, HttpStatusError) as e:
+                if attempt + 1 >= attempts:
+                    self.failures += 1
+                    raise
+                self.retried += 1
+                # Full jitter: spreads retries out when the board restarts
+                await asyncio.sleep(random.uniform(0, min(self.max_backoff_s, self.backoff_s * 2 ** attempt)))
+            except Exception:
+                self.failures += 1
+                raise
+
+    async def get_json(self, path: str, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post_json(self, path: str, payload, retry=False, **kwargs):
+        return await self.request("POST", path, retry=retry, json=payload, **kwargs)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "retried": self.retried,
+            "failures": self.failures,
+            "connections_opened": self.connections_opened,
+            "connections_reused": self.connections_reused,
+            "endpoints": {endpoint: h.summary() for endpoint, h in self.latency.items()},
+        }
+
+
+async def pooling_check(n=200, port=3992):
+    """Pooled vs fresh connections, plus a flaky endpoint that needs retries"""
+    import aiohttp
+    from aiohttp import web
+
+    failures_left = 2
+
+    async def board_items(request):
+        return web.json_response([{"id": "item-1", "title": "Liver panel"}])
+
+    async def flaky(request):
+        nonlocal failures_left
+        if failures_left:
+            failures_left -= 1
+            return web.Response(status=503)
+        return web.json_response({"ok": True})
+
+    app = web.Application()
+    app.router.add_get("/api/board-items", board_items)
+    app.router.add_get("/api/flaky", flaky)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", port).start()
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        # Previous behaviour: a new connection for every call
+        start = time.perf_counter()
+        for _ in range(n):
+            async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(force_close=True)) as session:
+                async with session.get(base_url + "/api/board-items") as response:
+                    await response.json()
+        fresh_ms = (time.perf_counter() - start) / n * 1000
+
+        client = BoardHttpClient(base_url)
+        start = time.perf_counter()
+        for _ in range(n):
+            await client.get_json("/api/board-items")
+        pooled_ms = (time.perf_counter() - start) / n * 1000
+        assert await client.get_json("/api/flaky") == {"ok": True}
+        stats = client.stats()
+        await client.close()
+    finally:
+        await runner.cleanup()
+
+    print(f"⏱️ Fresh connection: {fresh_ms:.2f} ms/request, pooled keep-alive: {pooled_ms:.2f} ms/request")
+    print(f"📊 {stats}")
+    assert stats["connections_opened"] <= 2 and stats["retried"] == 2
+    print("✅ Board requests reuse one warm connection and retry transient errors")
+
+
+if __name__ == "__main__":
+    asyncio.run(pooling_check())
@@ -0,0 +1,96 @@
+"""
+End-to-end latency tracer for the audio round trip
+
+Each turn is measured from the moment the participant stops speaking (the last
+captured speech chunk) to the assistant's first playback write:
+
+    capture -> send -> first server byte -> [first tool call -> tool done] -> first playback
+
+Stage offsets are collected per turn into rolling histograms and summarised as
+p50 / p95 / p99, which can be dumped to JSON at exit.
+"""
+
+import json
+import time
+from collections import deque
+import numpy as np
+
+STAGES = ("send", "first_server_byte", "first_tool_call", "tool_done", "first_playback")
+# A stage only counts once the stage it depends on was seen in the same turn
+REQUIRES = {"tool_done": "first_tool_call"}
+
+
+class RollingHistogram:
+    """Keeps the last `maxlen` samples and reports percentiles"""
+
+    def __init__(self, maxlen=1000):
+        self.samples = deque(maxlen=maxlen)
+
+    def add(self, value: float):
+        self.samples.append(value)
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": 0}
+        values = np.fromiter(self.samples, dtype=np.float64)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        return {
+            "count": len(values),
+            "p50_ms": round(float(p50), 1),
+            "p95_ms": round(float(p95), 1),
+            "p99_ms": round(float(p99), 1),
+            "max_ms": round(float(values.max()), 1),
+        }
+
+
+class LatencyTracer:
+    """Per-turn stage timestamps aggregated into rolling histograms"""
+
+    def __init__(self, maxlen=1000):
+        self.histograms = {stage: RollingHistogram(maxlen) for stage in STAGES}
+        self.turns = 0
+        self._reset()
+
+    def _reset(self):
+        self.speech_end = None
+        self.marks = {}
+
+    def _responding(self) -> bool:
+        return "first_server_byte" in self.marks
+
+    def mark_capture(self, captured_at: float):
+        """Latest captured speech chunk; frozen once the server starts answering"""
+        if not self._responding():
+            self.speech_end = captured_at
+            self.marks.pop("send", None)
+
+    def mark_sent(self, captured_at: float):
+        """A payload containing audio captured at `captured_at` went out"""
+        if self.speech_end is not None and captured_at is not None and captured_at >= self.speech_end \
+                and "send" not in self.marks and not self._responding():
+            self.marks["send"] = time.monotonic()
+
+    def mark(self, stage: str):
+        """Record the first occurrence of `stage` in the current turn"""
+        required = REQUIRES.get(stage)
+        if required and required not in self.marks:
+            return
+        self.marks.setdefault(stage, time.monotonic())
+
+    def finish_turn(self):
+        """Close the current turn and fold its offsets into the histograms"""
+        if self.speech_end is not None and self._responding():
+            self.turns += 1
+            for stage, at in self.marks.items():
+                self.histograms[stage].add((at - self.speech_end) * 1000)
+        self._reset()
+
+    def summary(self) -> dict:
+        return {
+            "turns": self.turns,
+            "stages_ms_since_speech_end": {stage: h.summary() for stage, h in self.histograms.items()},
+        }
+
+    def dump_json(self, path: str):
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
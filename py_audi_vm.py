@@ -1,5 +1,7 @@
 # pip install pyaudio numpy
 import pyaudio, wave, numpy as np, os, sys
+from audio_resample import StreamingResampler
+from device_registry import DeviceRegistry
 
 FILE_TO_PLAY = "sample.wav"      # put your WAV here (16- or 32-bit PCM)
 TARGET_DEVICE_SUBSTR = "Voicemeeter Input"   # we WRITE to this (VAIO)
@@ -8,17 +10,15 @@ FRAMES_PER_BUFFER = 480
 TARGET_VOL = 0.9
 
 pa = pyaudio.PyAudio()
+registry = DeviceRegistry(pa)
 
 def find_output_device(substr: str) -> int:
-    s = substr.lower()
-    for i in range(pa.get_device_count()):
-        d = pa.get_device_info_by_index(i)
-        if d.get('maxOutputChannels',0) > 0 and s in d['name'].lower():
-            return i
+    i = registry.find(substr, "output")
+    if i is not None:
+        return i
     print("[!] OUTPUT device not found. Devices:")
-    for i in range(pa.get_device_count()):
-        d = pa.get_device_info_by_index(i)
-        print(f"{i:>2} | out:{d.get('maxOutputChannels',0)} in:{d.get('maxInputChannels',0)} | {d['name']}")
+    for d in registry.devices():
+        print(f"{d['index']:>2} | out:{d.get('maxOutputChannels',0)} in:{d.get('maxInputChannels',0)} | {d['name']}")
     pa.terminate(); sys.exit(1)
 
 def wav_to_float_mono_48k(path: str) -> np.ndarray:
@@ -34,10 +34,8 @@ def wav_to_float_mono_48k(path: str) -> np.ndarray:
     if ch > 1:
         data = data.reshape(-1, ch).mean(axis=1)  # mono
     if sr != TARGET_SR:
-        n_to = int(round(data.shape[0] * TARGET_SR / sr))
-        xp = np.linspace(0, 1, data.shape[0], endpoint=False, dtype=np.float64)
-        xq = np.linspace(0, 1, n_to,         endpoint=False, dtype=np.float64)
-        data = np.interp(xq, xp, data.astype(np.float64)).astype(np.float32)
+        rs = StreamingResampler(sr, TARGET_SR)
+        data = np.concatenate([rs.process(data), rs.flush()])
     data *= TARGET_VOL
     return data.astype(np.float32)
 
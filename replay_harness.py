@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Offline replay harness for gemini_audio_only_cable2.py
+
+Runs the real `listen_audio` / `send_audio_to_gemini` / `receive_audio` /
+`play_audio` / `handle_tool_call` tasks with no devices, no meeting and no
+Gemini session:
+
+- PyAudio is replaced by file-backed devices: a WAV file is played into the
+  "CABLE Output" input device in real time, and everything written to the
+  "Voicemeeter Input" output device is recorded to a WAV file.
+- `client.aio.live.connect` is replaced by a local fake session that follows a
+  script of audio, tool-call and turn-complete events.
+- canvas_ops and the RAG lookups are replaced by local recorders returning
+  canned results, so no board server or embedding API is needed.
+- pyaudio and canvas_ops, imported by the client at module level, are put in
+  `sys.modules` as stand-ins when they are not installed, so the harness runs
+  without PortAudio or the board client.
+
+At the end a JSON report with throughput and latency numbers is printed (and
+optionally written to a file), suitable for CI. The client's own latency report
+goes next to the output WAV instead of the working directory.
+
+By default the replay runs until the event script has finished (plus a short
+tail for playback to drain); `--duration` caps it at a fixed time instead.
+
+Usage:
+python replay_harness.py --report replay_report.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import importlib.util
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+from types import ModuleType, SimpleNamespace
+import numpy as np
+
+from audio_resample import StreamingResampler
+
+DEVICE_RATE = 48000
+HERE = Path(__file__).resolve().parent
+SAMPLE_WAV = str(HERE / "sample.wav")
+MAX_REPLAY_S = 300.0  # safety cap when running until the script finishes
+
+# Each event runs after the previous one. "wait_uplink_s" waits for that many
+# seconds of participant audio to reach the session, "wait_idle_s" waits until
+# the uplink has been quiet that long (participant finished), "wait" waits for
+# a tool response, "delay_s" sleeps before the event fires.
+DEFAULT_SCRIPT = [
+    {"wait_uplink_s": 1.0},
+    {"wait_idle_s": 0.5},
+    {"type": "audio", "seconds": 2.0},
+    {"type": "turn_complete"},
+    {"wait_uplink_s": 1.0},
+    {"type": "transcript", "text": "Can you tell me what the latest ALT result was"},
+    {"wait_idle_s": 0.5},
+    {"type": "tool_call", "name": "query_chroma_collection", "args": {"query": "latest ALT result"}},
+    {"wait": "tool_response"},
+    {"type": "audio", "seconds": 1.5, "delay_s": 0.2},
+    {"type": "turn_complete"},
+    {"wait_uplink_s": 1.0},
+    {"wait_idle_s": 0.5},
+    {"type": "tool_call", "calls": [
+        {"name": "get_canvas_objects", "args": {"query": "liver panel"}},
+        {"name": "query_chroma_collection", "args": {"query": "What's the latest ALT result?"}},
+    ]},
+    {"wait": "tool_response"},
+    {"type": "tool_call", "name": "navigate_canvas", "args": {"objectId": "item-1"}},
+    {"wait": "tool_response"},
+    {"type": "tool_call", "name": "generate_lab_result",
+     "args": {"parameter": "ALT", "value": "245", "unit": "U/L", "status": "High"}},
+    {"wait": "tool_response"},
+    {"type": "tool_call", "name": "generate_task",
+     "args": {"title": "Review ALT trend", "content": "Compare ALT over the last 3 panels", "items": ["Pull ALT", "Plot trend"]}},
+    {"wait": "tool_response"},
+    {"type": "audio", "seconds": 1.0},
+    {"type": "turn_complete"},
+]
+
+
+def read_wav_mono(path: str, rate: int) -> np.ndarray:
+    """Read a PCM16 WAV as mono int16 at `rate`"""
+    with wave.open(path, "rb") as wf:
+        src_rate = wf.getframerate()
+        channels = wf.getnchannels()
+        raw = wf.readframes(wf.getnframes())
+    x = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        x = x.reshape(-1, channels).mean(axis=1)
+    if src_rate != rate:
+        rs = StreamingResampler(src_rate, rate)
+        x = np.concatenate([rs.process(x), rs.flush()])
+    return np.clip(x * 32768.0, -32768, 32767).astype(np.int16)
+
+
+# ----------------------------
+# File-backed PyAudio
+# ----------------------------
+class FileStream:
+    """Callback or blocking stream driven by a real-time clock thread"""
+
+    def __init__(self, device, rate, frames_per_buffer, input=False, output=False, stream_callback=None, **kwargs):
+        self.device = device
+        self.rate = rate
+        self.frames = frames_per_buffer or 1024
+        self.is_input = input
+        self.callback = stream_callback
+        self._running = False
+        self._thread = None
+
+    def start_stream(self):
+        if self.callback and not self._running:
+            self._running = True
+            self._thread = threading.Thread(target=self._pump, daemon=True)
+            self._thread.start()
+
+    def _pump(self):
+        period = self.frames / self.rate
+        next_tick = time.perf_counter()
+        while self._running:
+            if self.is_input:
+                self.callback(self.device.source(self.frames), self.frames, {}, 0)
+            else:
+                data, _ = self.callback(None, self.frames, {}, 0)
+                self.device.sink(data)
+            next_tick += period
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+
+    def read(self, frames, exception_on_overflow=True):
+        time.sleep(frames / self.rate)
+        return self.device.source(frames)
+
+    def write(self, data):
+        self.device.sink(data)
+        time.sleep(len(data) / 2 / self.rate)
+
+    def is_active(self):
+        return self._running
+
+    def stop_stream(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=1)
+
+    def close(self):
+        self.stop_stream()
+
+
+class FileInputDevice:
+    def __init__(self, name, path, rate, loop=True, gap_s=4.0):
+        self.name = name
+        self.rate = rate
+        # The participant repeats the recording with a pause after each take
+        self.samples = np.concatenate([read_wav_mono(path, rate), np.zeros(int(rate * gap_s), dtype=np.int16)])
+        self.pos = 0
+        self.loop = loop
+
+    def source(self, frames) -> bytes:
+        out = np.zeros(frames, dtype=np.int16)
+        chunk = self.samples[self.pos:self.pos + frames]
+        out[:len(chunk)] = chunk
+        self.pos += frames
+        if self.loop and self.pos >= len(self.samples):
+            self.pos = 0
+        return out.tobytes()
+
+
+class FileOutputDevice:
+    def __init__(self, name, rate):
+        self.name = name
+        self.rate = rate
+        self.chunks = []
+        self.first_audio_at = None
+
+    def sink(self, data: bytes):
+        self.chunks.append(data)
+        if self.first_audio_at is None and np.frombuffer(data, dtype=np.int16).any():
+            self.first_audio_at = time.monotonic()
+
+    def save(self, path):
+        with wave.open(path, "wb") as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.rate)
+            wf.writeframes(b"".join(self.chunks))
+
+
+class FilePyAudio:
+    """Just enough of pyaudio.PyAudio for the client's device lookup and streams"""
+
+    def __init__(self, input_path, rate=DEVICE_RATE, loop_input=True):
+        self.devices = [
+            FileInputDevice("CABLE Output (replay)", input_path, rate, loop=loop_input),
+            FileOutputDevice("Voicemeeter Input (replay)", rate),
+        ]
+
+    def get_device_count(self):
+        return len(self.devices)
+
+    def get_device_info_by_index(self, index):
+        device = self.devices[index]
+        is_input = isinstance(device, FileInputDevice)
+        return {
+            "index": index,
+            "name": device.name,
+            "maxInputChannels": 1 if is_input else 0,
+            "maxOutputChannels": 0 if is_input else 1,
+            "defaultSampleRate": float(device.rate),
+        }
+
+    def open(self, rate, input=False, output=False, input_device_index=None, output_device_index=None,
+             frames_per_buffer=1024, stream_callback=None, **kwargs):
+        device = self.devices[input_device_index if input else output_device_index]
+        return FileStream(device, rate, frames_per_buffer, input=input, output=output,
+                          stream_callback=stream_callback)
+
+    def terminate(self):
+        pass
+
+
+# ----------------------------
+# Local Live-API stand-in
+# ----------------------------
+class FakeLiveSession:
+    """Scriptable stand-in for the Live API session"""
+
+    def __init__(self, script, response_audio, chunk_ms=40, rate=24000):
+        self.script = script
+        self.response_audio = response_audio
+        self.chunk = int(rate * chunk_ms / 1000)
+        self.rate = rate
+        self.messages = asyncio.Queue()
+        self.audio_pos = 0
+        self.call_ids = 0
+        self.tool_response = asyncio.Event()
+        self.finished = asyncio.Event()  # every script event has been played
+
+        # Metrics
+        self.uplink_bytes = 0
+        self.uplink_sends = 0
+        self.audio_stream_ends = 0
+        self.text_inputs = 0
+        self.tool_calls = 0
+        self.tool_latencies_ms = []
+        self.turns = 0
+        self._tool_sent_at = None
+        self._last_uplink_at = time.monotonic()
+
+    async def send(self, input=None, end_of_turn=False):
+        if isinstance(input, dict):
+            self.uplink_bytes += len(input["data"])
+            self.uplink_sends += 1
+            if np.frombuffer(input["data"], dtype=np.int16).any():
+                self._last_uplink_at = time.monotonic()
+        else:
+            self.text_inputs += 1
+
+    async def send_realtime_input(self, audio_stream_end=None, **kwargs):
+        if audio_stream_end:
+            self.audio_stream_ends += 1
+
+    async def send_tool_response(self, function_responses=None):
+        if self._tool_sent_at is not None:
+            self.tool_latencies_ms.append((time.monotonic() - self._tool_sent_at) * 1000)
+            self._tool_sent_at = None
+        self.tool_response.set()
+
+    async def receive(self):
+        """Yield messages for one turn, like the real session"""
+        while True:
+            message = await self.messages.get()
+            yield message
+            if message.server_content and message.server_content.turn_complete:
+                return
+
+    @staticmethod
+    def _message(data=None, tool_call=None, turn_complete=False, interrupted=False, transcript=None):
+        server_content = None
+        if turn_complete or interrupted or transcript:
+            server_content = SimpleNamespace(turn_complete=turn_complete, interrupted=interrupted,
+                                             input_transcription=SimpleNamespace(text=transcript) if transcript else None)
+        return SimpleNamespace(data=data, tool_call=tool_call, server_content=server_content)
+
+    async def play_script(self):
+        for event in self.script:
+            if "wait_uplink_s" in event:
+                target = self.uplink_bytes + int(event["wait_uplink_s"] * 16000 * 2)
+                while self.uplink_bytes < target:
+                    await asyncio.sleep(0.01)
+            if "wait_idle_s" in event:
+                while time.monotonic() - self._last_uplink_at < event["wait_idle_s"]:
+                    await asyncio.sleep(0.01)
+            if event.get("wait") == "tool_response":
+                await self.tool_response.wait()
+            if "delay_s" in event:
+                await asyncio.sleep(event["delay_s"])
+
+            kind = event.get("type")
+            if kind == "audio":
+                # Faster than real time, in bursts, like the real server
+                remaining = int(event["seconds"] * self.rate)
+                while remaining > 0:
+                    n = min(self.chunk, remaining)
+                    chunk = np.take(self.response_audio, range(self.audio_pos, self.audio_pos + n), mode="wrap")
+                    self.audio_pos += n
+                    remaining -= n
+                    await self.messages.put(self._message(data=chunk.astype(np.int16).tobytes()))
+                    await asyncio.sleep(event.get("burst_gap_s", 0.005))
+            elif kind == "tool_call":
+                # Either a single "name"/"args" call or several under "calls"
+                function_calls = []
+                for call in event.get("calls", [event]):
+                    self.call_ids += 1
+                    function_calls.append(SimpleNamespace(id=f"call-{self.call_ids}", name=call["name"], args=dict(call["args"])))
+                self.tool_calls += 1
+                self.tool_response.clear()
+                self._tool_sent_at = time.monotonic()
+                await self.messages.put(self._message(tool_call=SimpleNamespace(function_calls=function_calls)))
+            elif kind == "transcript":
+                # Input transcription streams in a few words at a time
+                words = event["text"].split()
+                for i in range(0, len(words), 3):
+                    await self.messages.put(self._message(transcript=" ".join(words[i:i + 3])))
+                    await asyncio.sleep(0.15)
+            elif kind == "interrupted":
+                await self.messages.put(self._message(interrupted=True))
+            elif kind == "turn_complete":
+                self.turns += 1
+                await self.messages.put(self._message(turn_complete=True))
+        self.finished.set()
+
+    def stats(self) -> dict:
+        latencies = sorted(self.tool_latencies_ms)
+        return {
+            "uplink_bytes": self.uplink_bytes,
+            "uplink_sends": self.uplink_sends,
+            "audio_stream_ends": self.audio_stream_ends,
+            "text_inputs": self.text_inputs,
+            "tool_calls": self.tool_calls,
+            "tool_responses": len(latencies),
+            "tool_latency_ms_p50": round(latencies[len(latencies) // 2], 1) if latencies else None,
+            "tool_latency_ms_max": round(latencies[-1], 1) if latencies else None,
+            "turns": self.turns,
+        }
+
+
+class FakeLiveClient:
+    """Replaces `client.aio.live.connect` with the scripted session"""
+
+    def __init__(self, session):
+        self.session = session
+        self.aio = SimpleNamespace(live=SimpleNamespace(connect=self.connect))
+
+    @contextlib.asynccontextmanager
+    async def connect(self, model=None, config=None):
+        player = asyncio.create_task(self.session.play_script())
+        try:
+            yield self.session
+        finally:
+            player.cancel()
+
+
+class FakeCanvasOps:
+    """Records canvas operations instead of calling the board API
+
+    Created items show up in `board_items()` after `ready_delay_s`, like the
+    real board which lists them a little after the create call returns.
+    """
+
+    def __init__(self, ready_delay_s=0.2):
+        self.calls = []
+        self.ready_delay_s = ready_delay_s
+        self.items = []
+
+    async def _record(self, name, payload):
+        self.calls.append(name)
+        item = {"id": f"{name}-{len(self.calls)}", "payload": payload}
+        if name.startswith("create_"):
+            asyncio.get_running_loop().call_later(self.ready_delay_s, self.items.append, item)
+        return item
+
+    async def board_items(self):
+        return list(self.items)
+
+    async def focus_item(self, item_id):
+        return await self._record("focus_item", item_id)
+
+    async def create_lab(self, data):
+        return await self._record("create_lab", data)
+
+    async def create_todo(self, data):
+        return await self._record("create_todo", data)
+
+    async def create_result(self, data):
+        return await self._record("create_result", data)
+
+    async def get_agent_answer(self, data):
+        return await self._record("get_agent_answer", data)
+
+
+def install_stub_modules():
+    """Put stand-ins for missing pyaudio / canvas_ops in sys.modules (before the client import)"""
+    stubs = {}
+    pyaudio = ModuleType("pyaudio")
+    pyaudio.__dict__.update(paFloat32=1, paInt16=8, paContinue=0, paComplete=1, paInputUnderflow=1,
+                            paInputOverflow=2, paOutputUnderflow=4, paOutputOverflow=8,
+                            PyAudio=lambda: FilePyAudio(SAMPLE_WAV))
+    stubs["pyaudio"] = pyaudio
+    # The client's canvas_ops is replaced by a FakeCanvasOps right after the import
+    stubs["canvas_ops"] = ModuleType("canvas_ops")
+    for name, module in stubs.items():
+        if name not in sys.modules and importlib.util.find_spec(name) is None:
+            sys.modules[name] = module
+
+
+# ----------------------------
+# Runner
+# ----------------------------
+async def run_replay(input_path=SAMPLE_WAV, output_path=None, response_path=SAMPLE_WAV,
+                     script=None, duration_s=None, rag_answer="ALT 245 U/L on 2024-03-18 (elevated).",
+                     rag_delay_s=0.3, tail_s=3.0, latency_path=None):
+    """Replay for `duration_s`, or (None) until the script has finished plus `tail_s`"""
+    os.environ.setdefault("GOOGLE_API_KEY", "replay-harness")
+    install_stub_modules()
+    client_module = importlib.import_module("gemini_audio_only_cable2")
+    if latency_path is None:
+        latency_path = (os.path.splitext(output_path)[0] + "_latency.json" if output_path
+                        else os.path.join(tempfile.gettempdir(), "replay_latency.json"))
+    client_module.LATENCY_REPORT = latency_path
+
+    pya = FilePyAudio(input_path)
+    canvas = FakeCanvasOps()
+    client_module.pya = pya
+    client_module.canvas_ops = canvas
+
+    session = FakeLiveSession(script or DEFAULT_SCRIPT, read_wav_mono(response_path, 24000))
+    app = client_module.AudioOnlyGeminiCable()
+    app.client = FakeLiveClient(session)
+    app.devices.factory = lambda: pya
+
+    # Canned lookups: a blocking delay on the retrieval pool, like the real Chroma work
+    def blocking_lookup(answer):
+        time.sleep(rag_delay_s)
+        return answer
+
+    async def medical(query):
+        app.retrieval.medical_queries += 1
+        return await app.retrieval.run(blocking_lookup, [rag_answer])
+
+    async def canvas_lookup(query, items):
+        app.retrieval.canvas_queries += 1
+        return await app.retrieval.run(blocking_lookup, ["**objectId:** item-1\n**title:** Liver panel"])
+
+    app.retrieval._medical = medical
+    app.retrieval._canvas = canvas_lookup
+
+    async def fetch_board_items():
+        app.retrieval.board_fetches += 1
+        items = await canvas.board_items()
+        app.retrieval._note_board(items)
+        return items
+
+    app.retrieval.fetch_board_items = fetch_board_items
+    app.canvas_ready.fetch_items = canvas.board_items
+
+    started = time.monotonic()
+    runner = asyncio.create_task(app.run())
+    if duration_s is None:
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(session.finished.wait(), MAX_REPLAY_S)
+        await asyncio.sleep(tail_s)
+    else:
+        await asyncio.sleep(duration_s)
+    runner.cancel()
+    with contextlib.suppress(asyncio.CancelledError):
+        await runner
+    elapsed = time.monotonic() - started
+
+    sink = pya.devices[1]
+    if output_path:
+        sink.save(output_path)
+
+    report = {
+        "duration_s": round(elapsed, 2),
+        "script_finished": session.finished.is_set(),
+        "uplink_kbps": round(session.uplink_bytes * 8 / 1000 / elapsed, 1),
+        "session": session.stats(),
+        "canvas_calls": canvas.calls,
+        "latency": app.tracer.summary(),
+        "latency_report": latency_path,
+        "playback_s": round(sum(len(c) for c in sink.chunks) / 2 / sink.rate, 2),
+    }
+    for name in ("devices", "tool_executor", "capture", "vad", "out_queue", "echo", "playback", "barge_in",
+                 "retrieval", "canvas_ready", "tools", "prefetch",
+                 "responses", "jobs", "http"):
+        component = getattr(app, name, None)
+        if component is not None and hasattr(component, "stats"):
+            report[name] = component.stats()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a WAV through the client against a local fake Live API")
+    parser.add_argument("--input", default=SAMPLE_WAV, help="participant audio played into CABLE Output")
+    parser.add_argument("--response", default=SAMPLE_WAV, help="audio the fake model speaks")
+    parser.add_argument("--output", default=str(HERE / "replay_out.wav"), help="WAV recording of the playback device")
+    parser.add_argument("--script", help="JSON file with the event script")
+    parser.add_argument("--duration", type=float, default=None,
+                        help="stop after this many seconds (default: when the script has finished)")
+    parser.add_argument("--rag-delay", type=float, default=0.3, help="simulated latency of each RAG lookup")
+    parser.add_argument("--report", help="write the JSON report here")
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        with open(args.script) as f:
+            script = json.load(f)
+
+    report = asyncio.run(run_replay(args.input, args.output, args.response, script, args.duration,
+                                    rag_delay_s=args.rag_delay))
+    print(json.dumps(report, indent=2, default=str))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+TTL + LRU memoization for the retrieval tools
+
+The model keeps re-asking near-identical questions in a meeting ("latest ALT",
+"What's the latest ALT?"). Every one used to re-embed the query over the
+network and re-query the store. `RetrievalCache` sits in front of
+`RetrievalService.medical` / `.canvas`:
+
+- keys are (kind, corpus version, normalized query), so a new corpus version
+  never serves stale answers
+- entries expire after `ttl_s` and the least recently used are evicted past
+  `maxsize`
+- concurrent misses for the same key share one retrieval, run in its own
+  task: a caller that is cancelled (a tool call timing out) stops waiting
+  without cancelling it for the others
+- `invalidate(kind)` drops every entry of a corpus (patient data rebuilt,
+  board items changed)
+"""
+
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+# Filler words that do not change what is retrieved
+STOPWORDS = frozenset("a an the of for to me us please show what whats is are was were".split())
+_PUNCTUATION = re.compile(r"[^\w\s/.%-]+")
+
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and filler-insensitive form of a query"""
+    words = _PUNCTUATION.sub(" ", query.lower().replace("'s", "s")).split()
+    kept = [w.strip(".") for w in words if w.strip(".") not in STOPWORDS]
+    return " ".join(w for w in kept if w) or " ".join(words)
+
+
+class RetrievalCache:
+    """Memoizes retrieval results per corpus with TTL and LRU eviction"""
+
+    def __init__(self, maxsize=256, ttl_s=300.0, ttl_by_kind=None):
+        self.maxsize = maxsize
+        self.ttl_s = ttl_s
+        self.ttl_by_kind = ttl_by_kind or {}
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._pending = {}
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.shared_misses = 0
+
+    def _key(self, kind, version, query):
+        return (kind, version, normalize_query(query))
+
+    def get(self, kind, query, version=None):
+        """Cached value, or None on a miss"""
+        key = self._key(kind, version, query)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.monotonic():
+            del self._entries[key]
+            self.expired += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def put(self, kind, query, value, version=None):
+        key = self._key(kind, version, query)
+        self._entries[key] = (time.monotonic() + self.ttl_by_kind.get(kind, self.ttl_s), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, kind, query, compute, version=None):
+        """Cached value for `query`, else `await compute(query)` (shared by concurrent callers)"""
+        value = self.get(kind, query, version)
+        if value is not None:
+            self.hits += 1
+            return value
+        self.misses += 1
+        key = self._key(kind, version, query)
+        task = self._pending.get(key)
+        if task is not None:
+            self.shared_misses += 1
+        else:
+            task = asyncio.ensure_future(self._compute(kind, query, compute, version))
+            self._pending[key] = task
+
+            def finished(t):
+                if self._pending.get(key) is t:
+                    del self._pending[key]
+                # Retrieved here so a compute every caller gave up on does not warn
+                t.cancelled() or t.exception()
+
+            task.add_done_callback(finished)
+        # Shielded: this caller's cancellation must not reach the shared compute
+        return await asyncio.shield(task)
+
+    async def _compute(self, kind, query, compute, version):
+        value = await compute(query)
+        # Empty results are not cached: the corpus may just not be ready yet
+        if value:
+            self.put(kind, query, value, version)
+        return value
+
+    def invalidate(self, kind=None):
+        """Drop every entry of `kind` (or everything)"""
+        self.invalidations += 1
+        for key in [k for k in self._entries if kind is None or k[0] == kind]:
+            del self._entries[key]
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "shared_misses": self.shared_misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+async def benchmark(n=10000):
+    cache = RetrievalCache()
+
+    async def slow_lookup(query):
+        await asyncio.sleep(0.3)  # embedding request + store query
+        return f"ALT 245 U/L ({query})"
+
+    start = time.perf_counter()
+    await cache.get_or_compute("medical", "latest ALT", slow_lookup)
+    miss_ms = (time.perf_counter() - start) * 1000
+
+    questions = ["latest ALT", "What's the latest ALT?", "the latest alt", "Latest ALT please"]
+    start = time.perf_counter()
+    for i in range(n):
+        await cache.get_or_compute("medical", questions[i % len(questions)], slow_lookup)
+    hit_us = (time.perf_counter() - start) / n * 1e6
+
+    print(f"⏱️ Miss: {miss_ms:.1f} ms, hit: {hit_us:.1f} µs")
+    print(f"📊 {cache.stats()}")
+    assert cache.misses == 1 and hit_us < 100
+
+    # A caller cancelled mid-compute (tool-call timeout) leaves the other with the answer
+    first = asyncio.create_task(cache.get_or_compute("medical", "latest bilirubin", slow_lookup))
+    await asyncio.sleep(0.01)
+    second = asyncio.create_task(cache.get_or_compute("medical", "latest bilirubin", slow_lookup))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "ALT 245 U/L (latest bilirubin)"
+    assert first.cancelled() and cache.get("medical", "latest bilirubin")
+    print("✅ Cancelling one caller does not cancel the shared retrieval")
+
+
+if __name__ == "__main__":
+    asyncio.run(benchmark())
@@ -0,0 +1,128 @@
+"""
+Speculative retrieval prefetch from the live input transcription
+
+Retrieval used to start only after the model had listened, decided and emitted
+`query_chroma_collection`. With input transcription enabled the participant's
+words arrive while they are still speaking. `TranscriptPrefetcher` collects
+them and, once the transcript pauses for `debounce_s`, starts a medical
+retrieval for the last few words.
+
+When the model's tool call arrives, `claim(query)` returns the prefetch only
+if its transcript normalizes to exactly the same query: chunks retrieved for
+"latest bilirubin result" must never answer "latest ALT result". The prefetch
+may have finished already or still be running, and either way the handler
+awaits it instead of starting from scratch. Prefetches expire after `ttl_s`,
+and running ones are held in a set until they finish. Hits, misses and the
+retrieval time saved are counted so the benefit can be measured.
+
+Every pause in the transcript costs an embedding request and a query, so the
+client leaves this off unless RETRIEVAL_PREFETCH is set.
+"""
+
+import asyncio
+import time
+from collections import deque
+from retrieval_cache import normalize_query
+
+
+class TranscriptPrefetcher:
+    """Starts medical retrievals from the transcript before the tool call"""
+
+    def __init__(self, retrieve, debounce_s=0.3, min_words=2, window_words=16,
+                 ttl_s=20.0, max_entries=8):
+        self.retrieve = retrieve  # async (query) -> result
+        self.debounce_s = debounce_s
+        self.min_words = min_words
+        self.window_words = window_words
+        self.ttl_s = ttl_s
+        self._words = []
+        self._timer = None
+        self._entries = deque(maxlen=max_entries)  # [normalized query, task, started_at, finished_at]
+        self._tasks = set()  # running prefetches, including ones pushed out of _entries
+
+        # Metrics
+        self.fragments = 0
+        self.prefetches = 0
+        self.hits = 0
+        self.hits_in_flight = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def on_transcript(self, text: str):
+        """A streamed input-transcription fragment"""
+        if not text or not text.strip():
+            return
+        self.fragments += 1
+        self._words.extend(text.split())
+        del self._words[:-self.window_words]
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = asyncio.get_running_loop().call_later(self.debounce_s, self._fire)
+
+    def _fire(self):
+        self._timer = None
+        text = " ".join(self._words)
+        self._words = []
+        normalized = normalize_query(text)
+        if len(normalized.split()) < self.min_words:
+            return
+        self.prefetches += 1
+        task = asyncio.create_task(self.retrieve(text))
+        self._tasks.add(task)
+        entry = [normalized, task, time.monotonic(), None]
+
+        def finished(t):
+            entry[3] = time.monotonic()
+            self._tasks.discard(t)
+            # A failed prefetch only means the tool call does its own retrieval
+            t.cancelled() or t.exception()
+
+        task.add_done_callback(finished)
+        self._entries.append(entry)
+
+    def claim(self, query: str):
+        """Prefetch task for exactly this (normalized) query, or None (counted as a miss)"""
+        wanted = normalize_query(query)
+        now = time.monotonic()
+        best = None
+        for entry in reversed(self._entries):
+            normalized, task, started_at, _ = entry
+            if now - started_at > self.ttl_s or (task.done() and (task.cancelled() or task.exception())):
+                continue
+            if normalized == wanted:
+                best = entry
+                break
+        if best is None:
+            self.misses += 1
+            return None
+
+        _, task, started_at, finished_at = best
+        self.hits += 1
+        if not task.done():
+            self.hits_in_flight += 1
+        # Retrieval time the tool call did not have to spend
+        self.saved_ms += ((finished_at or now) - started_at) * 1000
+        return task
+
+    def reset(self):
+        """Drop pending transcript words (session end)"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._words = []
+        for task in self._tasks:
+            task.cancel()
+        self._tasks.clear()
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        claims = self.hits + self.misses
+        return {
+            "fragments": self.fragments,
+            "prefetches": self.prefetches,
+            "hits": self.hits,
+            "hits_in_flight": self.hits_in_flight,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / claims, 3) if claims else 0.0,
+            "saved_ms": round(self.saved_ms, 1),
+        }
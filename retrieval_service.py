@@ -0,0 +1,237 @@
+"""
+Async retrieval service for the RAG tools
+
+`query_chroma_collection` and `rag_from_json` are blocking: Chroma queries,
+embedding requests and the board-items `requests.get` all used to run on the
+event loop and froze capture, send and playback while they did. This service
+keeps the event loop free:
+
+- board items are fetched through the pooled `BoardHttpClient` and embeddings
+  through the async Gemini client, so network waits are plain awaits
+- Chroma work (chunking, in-memory index, persistent-collection query) runs on
+  the service's own thread pool, separate from asyncio's default executor used
+  by device opens
+- answers are memoized in a `RetrievalCache` keyed on the corpus version: the
+  patient store's ingest marker, and a hash of the board items; a canvas
+  lookup fetches the board first, so a hit is never served for a board the
+  canvas or another client has changed since
+
+A thread pool rather than a process pool: Chroma's client and collections are
+not picklable, and the heavy parts (HNSW search, numpy) release the GIL.
+
+Run this file directly for a loop-lag check: a 10 ms "audio" ticker keeps its
+cadence while a slow retrieval runs.
+"""
+
+import asyncio
+import hashlib
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from retrieval_cache import RetrievalCache
+from http_client import BoardHttpClient
+from chroma_db.store_version import store_version
+
+BOARD_URL = "http://localhost:3001"
+
+
+class RetrievalService:
+    """Medical-record and canvas RAG lookups that never block the event loop"""
+
+    def __init__(self, persist_dir="./chroma_db/chroma_store", board_url=BOARD_URL,
+                 max_workers=2, top_k=3, http_timeout_s=5.0, cache=None, http=None,
+                 board_dir="./chroma_db/board_store", backend=None):
+        self.persist_dir = persist_dir
+        self.board_dir = board_dir
+        self.backend = backend  # vector backend for both stores; None uses chroma_script.VECTOR_BACKEND
+        self._board_index = None
+        self._board_synced = None  # hash of the board items the index reflects
+        self._board_sync_lock = asyncio.Lock()
+        self.top_k = top_k
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="retrieval")
+        self.http = http if http is not None else BoardHttpClient(board_url, timeout_s=http_timeout_s)
+        # Board items change far more often than the patient store
+        self.cache = cache if cache is not None else RetrievalCache(ttl_by_kind={"canvas": 30.0})
+        self.board_version = None
+
+        # Metrics
+        self.medical_queries = 0
+        self.canvas_queries = 0
+        self.board_fetches = 0
+        self.errors = 0
+        self.executor_ms = 0.0
+
+    async def run(self, fn, *args):
+        """Run a blocking callable on the retrieval pool"""
+        start = time.monotonic()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        finally:
+            self.executor_ms += (time.monotonic() - start) * 1000
+
+    async def fetch_board_items(self):
+        """GET /api/board-items without blocking the loop"""
+        self.board_fetches += 1
+        items = await self.http.get_json("/api/board-items")
+        self._note_board(items)
+        return items
+
+    @staticmethod
+    def _board_hash(items) -> str:
+        return hashlib.sha1(json.dumps(items, sort_keys=True, default=str).encode()).hexdigest()
+
+    def _note_board(self, items):
+        """Track the board's content version; a change invalidates canvas answers"""
+        version = self._board_hash(items)
+        if self.board_version is not None and version != self.board_version:
+            self.cache.invalidate("canvas")
+        self.board_version = version
+
+    def store_version(self):
+        """Patient store version: the ingest marker (chroma.sqlite3 changes on every open)"""
+        return store_version(self.persist_dir)
+
+    async def medical(self, query: str) -> list:
+        """Top-k chunks from the persistent patient-record collection, most relevant first (cached)"""
+        return await self.cache.get_or_compute("medical", query, self._medical, self.store_version())
+
+    async def canvas(self, query: str) -> list:
+        """Top-k board-item chunks for `query`, most relevant first (cached per board version)"""
+        # Keyed on the items this lookup searches, fetched before the cache is consulted
+        items = await self.fetch_board_items()
+        return await self.cache.get_or_compute("canvas", query, lambda q: self._canvas(q, items),
+                                               self._board_hash(items))
+
+    async def _medical(self, query: str) -> list:
+        from chroma_db.chroma_script import embed_texts_async, query_chroma_by_embedding
+
+        self.medical_queries += 1
+        embeddings = await embed_texts_async([query], run=self.run)
+        if not embeddings:
+            self.errors += 1
+            return []
+        return await self.run(query_chroma_by_embedding, embeddings[0], self.persist_dir, "local_docs", self.top_k,
+                              self.backend)
+
+    def board_index(self):
+        if self._board_index is None:
+            from chroma_db.board_index import BoardIndex
+            self._board_index = BoardIndex(self.board_dir, backend=self.backend)
+        return self._board_index
+
+    async def sync_board(self, items):
+        """Embed only new/changed board items into the persistent index
+
+        Items whose chunks all embedded are applied; an item with a failed chunk
+        stays out of the index and is embedded again on the next sync.
+        """
+        from chroma_db.chroma_script import embed_texts_async
+
+        # Keyed on what this call indexes: board_version may already describe a newer fetch
+        version = self._board_hash(items)
+        async with self._board_sync_lock:
+            if self._board_synced == version:
+                return
+            index = self.board_index()
+            added, removed = await self.run(index.diff, items)
+            embeddings = await embed_texts_async([text for _, _, _, text in added], run=self.run,
+                                                 partial=True) if added else []
+            failed = {item_id for (_, item_id, _, _), embedding in zip(added, embeddings) if embedding is None}
+            if failed:
+                self.errors += 1
+                print(f"⚠️ {len(failed)} board item(s) could not be embedded; retrying them on the next sync")
+                kept = [(chunk, embedding) for chunk, embedding in zip(added, embeddings) if chunk[1] not in failed]
+                added, embeddings = [chunk for chunk, _ in kept], [embedding for _, embedding in kept]
+            await self.run(index.apply, added, embeddings, removed)
+            if not failed:
+                self._board_synced = version
+
+    async def _canvas(self, query: str, items) -> list:
+        """Sync the board index to `items`, then one query embedding and search"""
+        from chroma_db.chroma_script import embed_texts_async
+
+        self.canvas_queries += 1
+        # Syncing and embedding the query are independent requests
+        _, query_embedding = await asyncio.gather(self.sync_board(items), embed_texts_async([query], run=self.run))
+        if not query_embedding:
+            self.errors += 1
+            return []
+        return await self.run(self.board_index().query, query_embedding[0], self.top_k)
+
+    async def close(self):
+        await self.http.close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        return {
+            "medical_queries": self.medical_queries,
+            "canvas_queries": self.canvas_queries,
+            "board_fetches": self.board_fetches,
+            "errors": self.errors,
+            "executor_ms": round(self.executor_ms, 1),
+            "cache": self.cache.stats(),
+            "board_index": self._board_index.stats() if self._board_index else None,
+            "embedding_cache": self._chroma_script_stats("_embedding_cache"),
+            "embedding_pipeline": self._chroma_script_stats("_embedding_pipeline"),
+        }
+
+    @staticmethod
+    def _chroma_script_stats(name):
+        chroma_script = sys.modules.get("chroma_db.chroma_script")
+        component = getattr(chroma_script, name, None) if chroma_script else None
+        return component.stats() if component else None
+
+
+async def measure_loop_lag(work, tick_s=0.01):
+    """Max lateness (ms) of a `tick_s` ticker while `work` is awaited"""
+    max_lag = 0.0
+    done = asyncio.Event()
+
+    async def ticker():
+        nonlocal max_lag
+        expected = time.monotonic() + tick_s
+        while not done.is_set():
+            await asyncio.sleep(max(0.0, expected - time.monotonic()))
+            max_lag = max(max_lag, time.monotonic() - expected)
+            expected += tick_s
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(tick_s * 2)
+    try:
+        await work
+    finally:
+        done.set()
+        await task
+    return max_lag * 1000
+
+
+def slow_retrieval(seconds=1.0):
+    """Stand-in for a Chroma build + query: blocking I/O wait plus CPU work"""
+    import numpy as np
+    time.sleep(seconds / 2)
+    end = time.monotonic() + seconds / 2
+    vectors = np.random.default_rng(0).standard_normal((2000, 768)).astype(np.float32)
+    while time.monotonic() < end:
+        vectors @ vectors[0]
+    return "done"
+
+
+async def loop_lag_check(budget_ms=50.0):
+    service = RetrievalService()
+    try:
+        async def inline():
+            slow_retrieval()
+
+        blocked = await measure_loop_lag(inline())
+        offloaded = await measure_loop_lag(service.run(slow_retrieval))
+    finally:
+        await service.close()
+    print(f"⏱️ Max loop lag, retrieval on the loop:     {blocked:.1f} ms")
+    print(f"⏱️ Max loop lag, retrieval on the service: {offloaded:.1f} ms")
+    assert offloaded < budget_ms, f"audio tasks stalled for {offloaded:.1f} ms during retrieval"
+    print("✅ Audio tasks keep their cadence during retrieval")
+
+
+if __name__ == "__main__":
+    asyncio.run(loop_lag_check())
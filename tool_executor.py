@@ -0,0 +1,125 @@
+"""
+Concurrent tool-call executor
+
+`receive_audio` hands every `tool_call` to `ToolExecutor.submit` and goes
+straight back to reading server messages. Each call runs in its own supervised
+task with:
+
+- a concurrency limit shared by all calls
+- a timeout taken from the slowest tool in the call; on timeout the model gets
+  an error FunctionResponse for every function call so it is not left waiting.
+  The timeout covers the call up to its response: once the handler reports
+  `responded(tool_call)`, follow-up work (the "Ready." nudge) runs untimed and
+  can no longer produce a second, error response for the same call ids
+- cancellation of everything still running when the session ends
+
+Responses are sent by the handler (through `send_tool_response`) as each call
+completes, in completion order.
+"""
+
+import asyncio
+import time
+
+DEFAULT_TIMEOUT_S = 15.0
+
+
+class ToolExecutor:
+    """Runs tool calls off the receive loop with timeouts and a concurrency cap"""
+
+    def __init__(self, handler, on_timeout=None, max_concurrency=4,
+                 timeouts=None, default_timeout_s=DEFAULT_TIMEOUT_S):
+        self.handler = handler          # async def handler(tool_call)
+        self.on_timeout = on_timeout    # async def on_timeout(tool_call)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.timeouts = timeouts or {}
+        self.default_timeout_s = default_timeout_s
+        self.tasks = set()
+        self._responded = {}  # id(tool_call) -> Event, while supervised
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.cancelled = 0
+        self.max_in_flight = 0
+
+    def timeout_for(self, tool_call) -> float:
+        names = [fc.name for fc in tool_call.function_calls]
+        return max((self.timeouts.get(name, self.default_timeout_s) for name in names), default=self.default_timeout_s)
+
+    def submit(self, tool_call) -> asyncio.Task:
+        """Schedule a tool call and return immediately"""
+        self.submitted += 1
+        task = asyncio.create_task(self._supervise(tool_call))
+        self.tasks.add(task)
+        self.max_in_flight = max(self.max_in_flight, len(self.tasks))
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def responded(self, tool_call):
+        """Called by the handler once the call's response is sent; stops the timeout"""
+        event = self._responded.get(id(tool_call))
+        if event is not None:
+            event.set()
+
+    async def _run_until_responded(self, tool_call):
+        """Run the handler; TimeoutError if it has not responded within the call's timeout"""
+        responded = self._responded[id(tool_call)] = asyncio.Event()
+        handler = asyncio.create_task(self.handler(tool_call))
+        waiter = asyncio.create_task(responded.wait())
+        try:
+            done, _ = await asyncio.wait({handler, waiter}, timeout=self.timeout_for(tool_call),
+                                        return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                handler.cancel()
+                await asyncio.gather(handler, return_exceptions=True)
+                raise asyncio.TimeoutError
+            await handler
+        except asyncio.CancelledError:
+            handler.cancel()
+            raise
+        finally:
+            waiter.cancel()
+            self._responded.pop(id(tool_call), None)
+
+    async def _supervise(self, tool_call):
+        names = ", ".join(fc.name for fc in tool_call.function_calls)
+        start = time.monotonic()
+        try:
+            async with self.semaphore:
+                await self._run_until_responded(tool_call)
+            self.completed += 1
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            print(f"⏰ Tool call timed out after {time.monotonic() - start:.1f}s: {names}")
+            if self.on_timeout:
+                try:
+                    await self.on_timeout(tool_call)
+                except Exception as e:
+                    print(f"❌ Timeout response failed: {e}")
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        except Exception as e:
+            self.failed += 1
+            print(f"❌ Tool call task failed ({names}): {e}")
+
+    async def shutdown(self):
+        """Cancel every tool call still running (session end)"""
+        tasks = list(self.tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timed_out": self.timed_out,
+            "cancelled": self.cancelled,
+            "in_flight": len(self.tasks),
+            "max_in_flight": self.max_in_flight,
+        }
@@ -0,0 +1,173 @@
+"""
+Declarative tool registry
+
+Maps each entry of `FUNCTION_DECLARATIONS` to its handlers by `fc.name`
+instead of guessing the tool from the argument keys:
+
+- `respond(args)`      builds the FunctionResponse payload (sync or async)
+- `side_effect(args)`  optional canvas pipeline, run in the background so the
+                       model is answered without waiting for the board
+
+Argument validators are compiled from the declarations' JSON schemas once, at
+startup. Invalid arguments are answered with an error payload (so the model
+can retry) and skip the side effect. Unknown extra fields are allowed, as in
+JSON Schema. A declaration may ask the model for more fields than its handler
+needs; `register(..., required=[...])` then validates only those as required
+and leaves the rest to the handler's defaults.
+"""
+
+import asyncio
+import inspect
+import time
+from latency_tracer import RollingHistogram
+
+TYPE_CHECKS = {
+    "string": lambda v: isinstance(v, str),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool)
+                         or isinstance(v, float) and v.is_integer(),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, (list, tuple)),
+    "object": lambda v: isinstance(v, dict),
+}
+
+
+def compile_validator(schema: dict):
+    """Turn a declaration schema into `check(value, path) -> list of errors`"""
+    kind = schema.get("type", "object")
+    type_check = TYPE_CHECKS.get(kind)
+    properties = {key: compile_validator(sub) for key, sub in schema.get("properties", {}).items()}
+    required = tuple(schema.get("required", ()))
+    item_check = compile_validator(schema["items"]) if "items" in schema else None
+    enum = set(schema["enum"]) if "enum" in schema else None
+
+    def check(value, path="args"):
+        if type_check is not None and not type_check(value):
+            return [f"{path} must be {kind}"]
+        errors = []
+        if enum is not None and value not in enum:
+            errors.append(f"{path} must be one of {sorted(enum)}")
+        if kind == "object":
+            errors.extend(f"{path}.{key} is required" for key in required if key not in value)
+            for key, sub_check in properties.items():
+                if key in value:
+                    errors.extend(sub_check(value[key], f"{path}.{key}"))
+        elif kind == "array" and item_check is not None:
+            for i, item in enumerate(value):
+                errors.extend(item_check(item, f"{path}[{i}]"))
+        return errors
+
+    return check
+
+
+def relax_required(schema: dict, required) -> dict:
+    """Copy of `schema` requiring only the top-level `required` keys (nested objects require none)"""
+    schema = dict(schema)
+    if required is None:
+        schema.pop("required", None)
+    else:
+        schema["required"] = list(required)
+    if "properties" in schema:
+        schema["properties"] = {key: relax_required(sub, None) for key, sub in schema["properties"].items()}
+    if "items" in schema:
+        schema["items"] = relax_required(schema["items"], None)
+    return schema
+
+
+class Tool:
+    """One declared function with its validator, handlers and metrics"""
+
+    def __init__(self, declaration, respond=None, side_effect=None):
+        self.name = declaration["name"]
+        self.parameters = declaration.get("parameters", {"type": "object"})
+        self.validate = compile_validator(self.parameters)
+        self.respond = respond
+        self.side_effect = side_effect
+        self.latency = RollingHistogram()
+        self.calls = 0
+        self.invalid = 0
+        self.errors = 0
+
+    def stats(self) -> dict:
+        return {"calls": self.calls, "invalid": self.invalid, "errors": self.errors, "latency": self.latency.summary()}
+
+
+class ToolRegistry:
+    """Dispatches function calls by name to their registered handlers"""
+
+    def __init__(self, declarations):
+        self.tools = {decl["name"]: Tool(decl) for decl in declarations}
+        self.unknown_calls = 0
+        self._background = set()
+
+    def register(self, name, respond, side_effect=None, required=None):
+        """`required`: the arguments the handler cannot do without, if fewer than the declaration asks for"""
+        if name not in self.tools:
+            raise KeyError(f"{name} is not in FUNCTION_DECLARATIONS")
+        tool = self.tools[name]
+        tool.respond = respond
+        tool.side_effect = side_effect
+        if required is not None:
+            tool.validate = compile_validator(relax_required(tool.parameters, required))
+
+    def check(self):
+        """Every declared tool must have a response builder"""
+        missing = [name for name, tool in self.tools.items() if tool.respond is None]
+        if missing:
+            raise ValueError(f"No handler registered for: {', '.join(missing)}")
+
+    async def dispatch(self, name: str, args: dict) -> dict:
+        """Validate, start the side effect and return the response payload"""
+        tool = self.tools.get(name)
+        if tool is None:
+            self.unknown_calls += 1
+            return {"error": f"Unknown function: {name}"}
+        tool.calls += 1
+        args = dict(args or {})
+        errors = tool.validate(args)
+        if errors:
+            tool.invalid += 1
+            print(f"⚠️ Invalid arguments for {name}: {'; '.join(errors)}")
+            return {"error": f"Invalid arguments for {name}: {'; '.join(errors)}"}
+
+        start = time.monotonic()
+        try:
+            if tool.side_effect is not None:
+                self._start(tool, args)
+            result = tool.respond(args)
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            tool.errors += 1
+            print(f"❌ {name} failed: {e}")
+            return {"error": f"{name} failed: {e}"}
+        finally:
+            tool.latency.add((time.monotonic() - start) * 1000)
+
+    def _start(self, tool, args):
+        async def run():
+            try:
+                await tool.side_effect(args)
+            except Exception as e:
+                tool.errors += 1
+                print(f"❌ {tool.name} canvas update failed: {e}")
+
+        task = asyncio.create_task(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def shutdown(self):
+        """Cancel side effects still running (session end)"""
+        tasks = list(self._background)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "unknown_calls": self.unknown_calls,
+            "in_flight_side_effects": len(self._background),
+            "tools": {name: tool.stats() for name, tool in self.tools.items()},
+        }
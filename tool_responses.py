@@ -0,0 +1,113 @@
+"""
+Compact, budgeted FunctionResponse payloads for the retrieval tools
+
+The retrieval responses used to carry the result twice: once as data and again
+inside `message`, plus a boilerplate `explanation`. The model has to ingest all
+of it before it can start speaking. `ToolResponseBuilder.retrieval` sends the
+retrieved documents once:
+
+- documents stay in relevance order (most relevant first)
+- exact duplicates and the chunk overlap repeated at the start of a following
+  chunk are removed
+- the text is cut to a per-tool token budget, dropping the least relevant
+  documents first and trimming the last one that only partly fits at a line
+  boundary
+
+Response sizes (raw retrieved text vs sent payload) are counted per tool.
+"""
+
+import json
+
+CHARS_PER_TOKEN = 4  # rough estimate for English text
+MIN_OVERLAP_CHARS = 40
+MIN_PARTIAL_CHARS = 120  # below this a trimmed document is not worth sending
+
+
+def trim_overlap(kept: list, doc: str) -> str:
+    """Drop the start of `doc` that repeats the end of an already kept document"""
+    probe = doc[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return doc
+    best = 0
+    for previous in kept:
+        start = previous.find(probe)
+        while start != -1:
+            tail = previous[start:]
+            if doc.startswith(tail):
+                best = max(best, len(tail))
+                break
+            start = previous.find(probe, start + 1)
+    return doc[best:].lstrip() if best else doc
+
+
+def fit_documents(documents, budget_chars: int):
+    """Deduplicate and budget `documents` (most relevant first) -> (text, sent, omitted)
+
+    A document cut at the budget counts as sent (it ends with "…").
+    """
+    kept, seen = [], set()
+    dropped = 0
+    used = 0
+    for doc in documents:
+        doc = doc.strip()
+        if not doc or doc in seen:
+            continue
+        seen.add(doc)
+        doc = trim_overlap(kept, doc)
+        if not doc:
+            continue
+        room = budget_chars - used - (1 if kept else 0)
+        if len(doc) > room:
+            # Keep whole lines of the part that fits, if that is worth sending
+            head = doc[:max(0, room - 2)]  # room for " …"
+            cut = head.rsplit("\n", 1)[0] if "\n" in head else head
+            if cut and (len(cut) >= MIN_PARTIAL_CHARS or not kept):
+                kept.append(cut.rstrip() + " …")
+                used = budget_chars
+            else:
+                dropped += 1
+            continue
+        kept.append(doc)
+        used += len(doc) + (1 if len(kept) > 1 else 0)
+    return "\n".join(kept), len(kept), dropped
+
+
+class ToolResponseBuilder:
+    """Builds deduplicated, token-budgeted retrieval responses and tracks their size"""
+
+    def __init__(self, budgets_tokens=None, default_budget_tokens=800):
+        self.budgets_tokens = budgets_tokens or {}
+        self.default_budget_tokens = default_budget_tokens
+        self.sizes = {}
+
+    def budget_chars(self, tool_name: str) -> int:
+        return self.budgets_tokens.get(tool_name, self.default_budget_tokens) * CHARS_PER_TOKEN
+
+    def retrieval(self, tool_name: str, status: str, data_key: str, query: str, documents) -> dict:
+        """{"result": {...}} with the documents sent once, within the tool's budget"""
+        if isinstance(documents, str):
+            documents = [documents]
+        text, kept, dropped = fit_documents(documents, self.budget_chars(tool_name))
+        result = {"status": status, "query": query, data_key: text}
+        if dropped:
+            result["omitted_documents"] = dropped
+        response = {"result": result}
+        self._record(tool_name, sum(len(d) for d in documents), len(json.dumps(response)), dropped)
+        return response
+
+    def _record(self, tool_name, raw_chars, sent_chars, dropped):
+        size = self.sizes.setdefault(tool_name, {"responses": 0, "raw_chars": 0, "sent_chars": 0,
+                                                 "max_sent_chars": 0, "omitted_documents": 0})
+        size["responses"] += 1
+        size["raw_chars"] += raw_chars
+        size["sent_chars"] += sent_chars
+        size["max_sent_chars"] = max(size["max_sent_chars"], sent_chars)
+        size["omitted_documents"] += dropped
+
+    def stats(self) -> dict:
+        stats = {}
+        for tool_name, size in self.sizes.items():
+            stats[tool_name] = dict(size,
+                                    avg_sent_tokens=round(size["sent_chars"] / size["responses"] / CHARS_PER_TOKEN),
+                                    budget_tokens=self.budget_chars(tool_name) // CHARS_PER_TOKEN)
+        return stats